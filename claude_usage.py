@@ -0,0 +1,211 @@
+"""
+Claude Code usage from local transcripts, without ccusage.
+
+Claude Code writes one JSONL transcript per session under
+`<config dir>/projects/**/*.jsonl`. Assistant messages carry token usage, so
+daily totals can be built by reading those files directly:
+
+- Files are parsed in parallel across a process pool (one task per file)
+- Messages are deduplicated by message ID + request ID across all files, since
+  streamed messages are written once per content block and resumed sessions
+  copy earlier history into a new transcript
+- Rows have the `ccusage daily --json` shape, so `vibereps-usage.py --native`
+  can use them in place of ccusage's
+
+Cost uses the `costUSD` recorded in the transcript when present, otherwise
+the built-in price table below, which is not kept up to date the way
+ccusage's pricing is: a model newer than the table is priced as the table's
+closest family row, and unknown models count tokens but no cost.
+"""
+
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from exercise_log import timestamp_to_local_date
+
+
+# USD per million tokens: (input, output, cache write, cache read).
+# Matched by substring against the model ID, first match wins.
+MODEL_PRICES = [
+    ("opus-4-5", (5.0, 25.0, 6.25, 0.50)),
+    ("opus", (15.0, 75.0, 18.75, 1.50)),
+    ("sonnet", (3.0, 15.0, 3.75, 0.30)),
+    ("haiku-4", (1.0, 5.0, 1.25, 0.10)),
+    ("haiku-3-5", (0.80, 4.0, 1.0, 0.08)),
+    ("3-5-haiku", (0.80, 4.0, 1.0, 0.08)),
+    ("haiku", (0.25, 1.25, 0.30, 0.03)),
+]
+
+# Files per worker before a process pool is worth its startup cost
+MIN_FILES_PER_WORKER = 8
+
+
+def claude_data_dirs() -> list:
+    """Claude Code config directories that contain transcripts."""
+    if os.getenv("CLAUDE_CONFIG_DIR"):
+        dirs = [Path(d).expanduser() for d in os.environ["CLAUDE_CONFIG_DIR"].split(",") if d]
+    else:
+        dirs = [Path.home() / ".config" / "claude", Path.home() / ".claude"]
+    return [d for d in dirs if (d / "projects").is_dir()]
+
+
+def transcript_files(since: Optional[str] = None) -> list:
+    """Transcript paths, skipping files last written before `since` (YYYY-MM-DD)."""
+    cutoff = datetime.strptime(since, "%Y-%m-%d").timestamp() if since else 0
+    files = []
+    for data_dir in claude_data_dirs():
+        for path in (data_dir / "projects").rglob("*.jsonl"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if st.st_mtime >= cutoff:
+                files.append((st.st_size, str(path)))
+    # Largest first so one big transcript isn't left running on its own at the end
+    files.sort(reverse=True)
+    return [path for _, path in files]
+
+
+def model_cost(model: str, input_tokens: int, output_tokens: int,
+               cache_creation: int, cache_read: int) -> float:
+    for key, (inp, out, write, read) in MODEL_PRICES:
+        if key in model:
+            return (input_tokens * inp + output_tokens * out +
+                    cache_creation * write + cache_read * read) / 1_000_000
+    return 0.0
+
+
+def parse_transcript(path: str, since: Optional[str] = None, until: Optional[str] = None) -> list:
+    """
+    Usage records from one transcript file.
+
+    Returns (dedupe_key, date, model, input, output, cache_creation,
+    cache_read, cost) tuples. dedupe_key is None when the message has no IDs.
+    """
+    records = []
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return records
+
+    with f:
+        for line in f:
+            # Cheap filter: only assistant messages with usage are interesting
+            if b'"usage"' not in line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+            message = entry.get("message")
+            if not isinstance(message, dict):
+                continue
+            usage = message.get("usage")
+            timestamp = entry.get("timestamp")
+            if not isinstance(usage, dict) or not isinstance(timestamp, str):
+                continue
+            model = message.get("model") or "unknown"
+            if model == "<synthetic>":
+                continue
+
+            day = timestamp_to_local_date(timestamp)
+            if not day or (since and day < since) or (until and day > until):
+                continue
+
+            input_tokens = usage.get("input_tokens") or 0
+            output_tokens = usage.get("output_tokens") or 0
+            cache_creation = usage.get("cache_creation_input_tokens") or 0
+            cache_read = usage.get("cache_read_input_tokens") or 0
+            cost = entry.get("costUSD")
+            if not isinstance(cost, (int, float)):
+                cost = model_cost(model, input_tokens, output_tokens, cache_creation, cache_read)
+
+            message_id = message.get("id")
+            request_id = entry.get("requestId")
+            key = f"{message_id}:{request_id}" if message_id and request_id else None
+
+            records.append((key, day, model, input_tokens, output_tokens,
+                            cache_creation, cache_read, cost))
+    return records
+
+
+def _parse_transcript_args(args: tuple) -> list:
+    return parse_transcript(*args)
+
+
+def daily_usage(since: Optional[str] = None, until: Optional[str] = None,
+                workers: Optional[int] = None) -> Optional[dict]:
+    """
+    Per-day usage in `ccusage daily --json` shape, or None without transcripts.
+
+    `since`/`until` are inclusive YYYY-MM-DD local dates.
+    """
+    files = transcript_files(since)
+    if not files and not claude_data_dirs():
+        return None
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, max(1, len(files) // MIN_FILES_PER_WORKER))
+    tasks = [(path, since, until) for path in files]
+
+    if workers > 1:
+        # Spawned, not forked: callers run this on a worker thread, and
+        # forking a process with other threads running isn't safe
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = pool.map(_parse_transcript_args, tasks, chunksize=4)
+            per_file = list(results)
+    else:
+        per_file = [parse_transcript(*task) for task in tasks]
+
+    seen = set()
+    days = {}  # date -> {model: [input, output, cache_creation, cache_read, cost]}
+    for records in per_file:
+        for key, day, model, inp, out, cc, cr, cost in records:
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            totals = days.setdefault(day, {}).setdefault(model, [0, 0, 0, 0, 0.0])
+            totals[0] += inp
+            totals[1] += out
+            totals[2] += cc
+            totals[3] += cr
+            totals[4] += cost
+
+    daily = []
+    for day in sorted(days):
+        models = days[day]
+        breakdowns = [
+            {
+                "modelName": model,
+                "inputTokens": t[0],
+                "outputTokens": t[1],
+                "cacheCreationTokens": t[2],
+                "cacheReadTokens": t[3],
+                "cost": t[4]
+            }
+            for model, t in sorted(models.items(), key=lambda item: -item[1][4])
+        ]
+        row = {
+            "date": day,
+            "inputTokens": sum(b["inputTokens"] for b in breakdowns),
+            "outputTokens": sum(b["outputTokens"] for b in breakdowns),
+            "cacheCreationTokens": sum(b["cacheCreationTokens"] for b in breakdowns),
+            "cacheReadTokens": sum(b["cacheReadTokens"] for b in breakdowns),
+            "totalCost": sum(b["cost"] for b in breakdowns),
+            "modelsUsed": sorted(models),
+            "modelBreakdowns": breakdowns
+        }
+        row["totalTokens"] = (row["inputTokens"] + row["outputTokens"] +
+                              row["cacheCreationTokens"] + row["cacheReadTokens"])
+        daily.append(row)
+
+    return {"daily": daily}
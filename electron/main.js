@@ -164,7 +164,35 @@ function timestampToLocalDate(timestamp) {
   return `${year}-${month}-${day}`;
 }
 
-// Get today's exercise stats from log file
+// Read the log backwards from the end, one line at a time, newest first.
+// The log is append-only, so callers can stop as soon as they reach older entries.
+function* readLogLinesReversed(filePath, chunkSize = 64 * 1024) {
+  const fd = fs.openSync(filePath, 'r');
+  try {
+    let position = fs.fstatSync(fd).size;
+    let leftover = Buffer.alloc(0);
+    while (position > 0) {
+      const length = Math.min(chunkSize, position);
+      position -= length;
+      const chunk = Buffer.alloc(length);
+      fs.readSync(fd, chunk, 0, length, position);
+      const buffer = Buffer.concat([chunk, leftover]);
+      let end = buffer.length;
+      for (let i = buffer.length - 1; i >= 0; i--) {
+        if (buffer[i] === 0x0a) {
+          if (end > i + 1) yield buffer.toString('utf8', i + 1, end);
+          end = i;
+        }
+      }
+      leftover = buffer.subarray(0, end);
+    }
+    if (leftover.length > 0) yield leftover.toString('utf8');
+  } finally {
+    fs.closeSync(fd);
+  }
+}
+
+// Get today's exercise stats from log file (only reads today's tail of the log)
 function getTodayExerciseStats() {
   const today = getTodayDate();
   const stats = {};
@@ -172,17 +200,18 @@ function getTodayExerciseStats() {
 
   try {
     if (fs.existsSync(exerciseLogPath)) {
-      const lines = fs.readFileSync(exerciseLogPath, 'utf8').trim().split('\n');
-      for (const line of lines) {
+      for (const line of readLogLinesReversed(exerciseLogPath)) {
+        let entry;
         try {
-          const entry = JSON.parse(line);
-          const date = timestampToLocalDate(entry.timestamp);
-          if (date === today && entry.reps > 0 && !entry.exercise?.startsWith('_')) {
-            const exercise = entry.exercise || 'unknown';
-            stats[exercise] = (stats[exercise] || 0) + entry.reps;
-            totalReps += entry.reps;
-          }
-        } catch (e) { /* skip malformed lines */ }
+          entry = JSON.parse(line);
+        } catch (e) { continue; /* skip malformed lines */ }
+        const date = timestampToLocalDate(entry.timestamp);
+        if (date && date < today) break;
+        if (date === today && entry.reps > 0 && !entry.exercise?.startsWith('_')) {
+          const exercise = entry.exercise || 'unknown';
+          stats[exercise] = (stats[exercise] || 0) + entry.reps;
+          totalReps += entry.reps;
+        }
       }
     }
   } catch (err) {
@@ -0,0 +1,361 @@
+"""
+exercise_columns.py - Columnar view of the local exercise history
+
+Loads exercises.jsonl and its monthly segments into typed arrays (one per
+field) instead of a dict per entry, for reports over months or years:
+
+    timestamp  int64   epoch seconds
+    day        int32   local date as a proleptic ordinal (date.toordinal())
+    exercise   uint16  code into `exercises`
+    reps       int32
+    duration   int32   seconds
+    mode       uint16  code into `modes`
+
+That is 24 bytes per set. Closed segments never change, so each one's
+columns are cached next to it (`exercises-YYYY-MM.cols`) and reloading
+years of history reads those files instead of decompressing and parsing
+JSON. Group-bys run in numpy when it is installed (zero-copy views of the
+arrays) and fall back to plain loops otherwise.
+
+Used by vibereps-usage.py. The MCP server keeps its own incremental
+per-day and time indexes instead (see mcp_exercise_server.py).
+"""
+
+import array
+import json
+import os
+import sys
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import accumulate
+from pathlib import Path
+
+from exercise_log import (
+    LOG_FILE, current_tz, iter_log_entries, iter_segment_lines, list_segments,
+    parse_line, timestamp_to_local_date
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# (attribute, array typecode) in on-disk order
+COLUMNS = (
+    ("timestamp", "q"),
+    ("day", "i"),
+    ("exercise", "H"),
+    ("reps", "i"),
+    ("duration", "i"),
+    ("mode", "H"),
+)
+CACHE_SUFFIX = ".cols"
+CACHE_VERSION = 2  # 2: uint16 mode codes
+INT32_MAX = 2 ** 31 - 1
+
+
+@lru_cache(maxsize=8192)
+def _day_ordinal(local_date: str) -> int:
+    try:
+        return date.fromisoformat(local_date).toordinal()
+    except ValueError:
+        return 0
+
+
+def _epoch(ts: str) -> int:
+    try:
+        # Naive timestamps (the hook) are local time, as timestamp() assumes
+        return int(datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return 0
+
+
+def _int32(value) -> int:
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return 0
+    return max(0, min(int(value), INT32_MAX))
+
+
+class ExerciseColumns:
+    """Exercise entries as parallel typed arrays, with group-by helpers."""
+
+    def __init__(self):
+        for name, typecode in COLUMNS:
+            setattr(self, name, array.array(typecode))
+        self.exercises = []  # exercise code -> name
+        self.modes = []      # mode code -> name
+        self._exercise_codes = {}
+        self._mode_codes = {}
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    # ============== Building ==============
+
+    @staticmethod
+    def _code(value: str, names: list, codes: dict) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(names)
+            names.append(value)
+        return code
+
+    def append(self, entry: dict) -> bool:
+        """Add one parsed log entry. Returns False if it has no usable timestamp."""
+        ts = entry.get("timestamp")
+        if not isinstance(ts, str):
+            return False
+        day = _day_ordinal(timestamp_to_local_date(ts))
+        if not day:
+            return False
+        mode = entry.get("mode")
+        self.timestamp.append(_epoch(ts))
+        self.day.append(day)
+        self.exercise.append(self._code(entry.get("exercise", "unknown"), self.exercises, self._exercise_codes))
+        self.reps.append(_int32(entry.get("reps")))
+        self.duration.append(_int32(entry.get("duration")))
+        self.mode.append(self._code(mode if isinstance(mode, str) else "", self.modes, self._mode_codes))
+        return True
+
+    def extend(self, other: "ExerciseColumns"):
+        """Append all rows of `other`, remapping its category codes."""
+        exercise_map = [self._code(name, self.exercises, self._exercise_codes) for name in other.exercises]
+        mode_map = [self._code(name, self.modes, self._mode_codes) for name in other.modes]
+        self.timestamp.extend(other.timestamp)
+        self.day.extend(other.day)
+        self.reps.extend(other.reps)
+        self.duration.extend(other.duration)
+        if exercise_map == list(range(len(exercise_map))):
+            self.exercise.extend(other.exercise)
+        else:
+            self.exercise.extend(array.array("H", (exercise_map[c] for c in other.exercise)))
+        if mode_map == list(range(len(mode_map))):
+            self.mode.extend(other.mode)
+        else:
+            self.mode.extend(array.array("H", (mode_map[c] for c in other.mode)))
+
+    def select(self, since: str = None, until: str = None) -> "ExerciseColumns":
+        """Rows whose local date is in [since, until] (YYYY-MM-DD, inclusive)."""
+        lo = _day_ordinal(since) if since else 0
+        hi = _day_ordinal(until) if until else INT32_MAX
+        selected = ExerciseColumns()
+        selected.exercises, selected.modes = list(self.exercises), list(self.modes)
+        selected._exercise_codes, selected._mode_codes = dict(self._exercise_codes), dict(self._mode_codes)
+
+        if np is not None and len(self):
+            days = np.frombuffer(self.day, dtype=self.day.typecode)
+            mask = (days >= lo) & (days <= hi)
+            for name, typecode in COLUMNS:
+                column = getattr(self, name)
+                getattr(selected, name).frombytes(np.frombuffer(column, dtype=typecode)[mask].tobytes())
+            return selected
+
+        rows = [i for i, day in enumerate(self.day) if lo <= day <= hi]
+        for name, typecode in COLUMNS:
+            column = getattr(self, name)
+            setattr(selected, name, array.array(typecode, (column[i] for i in rows)))
+        return selected
+
+    @classmethod
+    def from_entries(cls, entries) -> "ExerciseColumns":
+        columns = cls()
+        for entry in entries:
+            columns.append(entry)
+        return columns
+
+    @classmethod
+    def load(cls, log_file: Path = LOG_FILE, since: str = None, until: str = None) -> "ExerciseColumns":
+        """
+        Columns for the whole history (segments, then the active log).
+
+        With `since`/`until`, segments from other months are not read and only
+        that range of the active log is decoded.
+        """
+        log_file = Path(log_file)
+        columns = cls()
+        for path in list_segments(log_file):
+            month = path.name[len(log_file.stem) + 1:][:7]
+            if (since and month < since[:7]) or (until and month > until[:7]):
+                continue
+            columns.extend(cls.load_segment(path))
+        for entry in iter_log_entries(log_file, since, until):
+            columns.append(entry)
+        if since or until:
+            columns = columns.select(since, until)
+        return columns
+
+    # ============== Segment cache ==============
+
+    @classmethod
+    def load_segment(cls, path: Path) -> "ExerciseColumns":
+        """Columns of one closed segment, from its .cols cache when still valid."""
+        path = Path(path)
+        cache = path.with_name(path.name.replace(".jsonl.gz", "") + CACHE_SUFFIX)
+        st = path.stat()
+        source = [st.st_size, st.st_mtime_ns]
+
+        cached = cls._read_cache(cache, source)
+        if cached is not None:
+            return cached
+
+        columns = cls.from_entries(filter(None, map(parse_line, iter_segment_lines(path))))
+        try:
+            columns._write_cache(cache, source)
+        except OSError:
+            pass  # Cache is an optimization only
+        return columns
+
+    def _write_cache(self, cache: Path, source: list):
+        header = {
+            "version": CACHE_VERSION,
+            "byteorder": sys.byteorder,
+            "tz": current_tz(),  # `day` depends on the local time zone
+            "source": source,
+            "rows": len(self),
+            "exercises": self.exercises,
+            "modes": self.modes
+        }
+        tmp = cache.with_name(cache.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            for name, _ in COLUMNS:
+                getattr(self, name).tofile(f)
+        os.replace(tmp, cache)
+
+    @classmethod
+    def _read_cache(cls, cache: Path, source: list):
+        try:
+            with open(cache, "rb") as f:
+                header = json.loads(f.readline())
+                if (header.get("version") != CACHE_VERSION or header.get("byteorder") != sys.byteorder
+                        or header.get("tz") != current_tz() or header.get("source") != source):
+                    return None
+                columns = cls()
+                for name, _ in COLUMNS:
+                    getattr(columns, name).fromfile(f, header["rows"])
+        except (OSError, EOFError, ValueError, KeyError, AttributeError):
+            return None
+        columns.exercises = header["exercises"]
+        columns.modes = header["modes"]
+        columns._exercise_codes = {name: i for i, name in enumerate(columns.exercises)}
+        columns._mode_codes = {name: i for i, name in enumerate(columns.modes)}
+        return columns
+
+    # ============== Group-bys ==============
+
+    def _values(self, column: str):
+        """Weights for a group-by: a column, or None to count sets."""
+        if column == "sets":
+            return None
+        if column not in ("reps", "duration"):
+            raise ValueError(f"Can't sum column {column!r}")
+        return getattr(self, column)
+
+    def _group(self, keys, n_groups: int, column: str) -> list:
+        """Sum `column` into `n_groups` buckets by integer key (0 <= key < n_groups)."""
+        values = self._values(column)
+        if np is not None:
+            weights = None if values is None else np.frombuffer(values, dtype=values.typecode)
+            totals = np.bincount(keys, weights=weights, minlength=n_groups)
+            return totals.astype(np.int64).tolist()
+
+        totals = [0] * n_groups
+        if values is None:
+            for key in keys:
+                totals[key] += 1
+        else:
+            for key, value in zip(keys, values):
+                totals[key] += value
+        return totals
+
+    def _day_range(self):
+        """(first, last) day ordinal."""
+        if np is not None:
+            days = np.frombuffer(self.day, dtype=self.day.typecode)
+            return int(days.min()), int(days.max())
+        return min(self.day), max(self.day)
+
+    def _day_keys(self):
+        """(keys, first ordinal, number of days) with key = day - first ordinal."""
+        first, last = self._day_range()
+        if np is not None:
+            keys = np.frombuffer(self.day, dtype=self.day.typecode) - first
+        else:
+            keys = [day - first for day in self.day]
+        return keys, first, last - first + 1
+
+    def totals_by_day(self, column: str = "reps") -> dict:
+        """{YYYY-MM-DD: total} for days with any sets."""
+        if not len(self):
+            return {}
+        keys, first, n_days = self._day_keys()
+        totals = self._group(keys, n_days, column)
+        sets = totals if column == "sets" else self._group(keys, n_days, "sets")
+        return {
+            date.fromordinal(first + i).isoformat(): total
+            for i, total in enumerate(totals) if sets[i]
+        }
+
+    def totals_by_week(self, column: str = "reps") -> dict:
+        """{Monday of the week as YYYY-MM-DD: total} for weeks with any sets."""
+        if not len(self):
+            return {}
+        # Ordinal 1 (0001-01-01) is a Monday
+        first, last = self._day_range()
+        first_week = (first - 1) // 7
+        if np is not None:
+            keys = (np.frombuffer(self.day, dtype=self.day.typecode) - 1) // 7 - first_week
+        else:
+            keys = [(day - 1) // 7 - first_week for day in self.day]
+        n_weeks = (last - 1) // 7 - first_week + 1
+        totals = self._group(keys, n_weeks, column)
+        sets = totals if column == "sets" else self._group(keys, n_weeks, "sets")
+        return {
+            date.fromordinal((first_week + i) * 7 + 1).isoformat(): total
+            for i, total in enumerate(totals) if sets[i]
+        }
+
+    def totals_by_exercise(self, column: str = "reps") -> dict:
+        """{exercise: total} over all rows."""
+        if not len(self):
+            return {}
+        keys = np.frombuffer(self.exercise, dtype=self.exercise.typecode) if np is not None else self.exercise
+        totals = self._group(keys, len(self.exercises), column)
+        sets = totals if column == "sets" else self._group(keys, len(self.exercises), "sets")
+        return {name: totals[i] for i, name in enumerate(self.exercises) if sets[i]}
+
+    def totals_by_day_and_exercise(self, column: str = "reps") -> dict:
+        """{YYYY-MM-DD: {exercise: total}}, the shape `ExerciseIndex.daily_totals()` returns."""
+        if not len(self):
+            return {}
+        day_keys, first, n_days = self._day_keys()
+        n_exercises = len(self.exercises)
+        if np is not None:
+            keys = day_keys * n_exercises + np.frombuffer(self.exercise, dtype=self.exercise.typecode)
+        else:
+            keys = [d * n_exercises + e for d, e in zip(day_keys, self.exercise)]
+        totals = self._group(keys, n_days * n_exercises, column)
+        sets = totals if column == "sets" else self._group(keys, n_days * n_exercises, "sets")
+
+        by_day = {}
+        for key, total in enumerate(totals):
+            if sets[key]:
+                day, exercise = divmod(key, n_exercises)
+                by_day.setdefault(date.fromordinal(first + day).isoformat(), {})[self.exercises[exercise]] = total
+        return by_day
+
+    def rolling(self, window_days: int = 7, column: str = "reps") -> dict:
+        """
+        {YYYY-MM-DD: total over the `window_days` days ending that day}.
+
+        Covers every day from the first set to the last, including rest days.
+        """
+        if not len(self):
+            return {}
+        keys, first, n_days = self._day_keys()
+        daily = self._group(keys, n_days, column)
+        running = [0] + list(accumulate(daily))
+        return {
+            date.fromordinal(first + i).isoformat(): running[i + 1] - running[max(0, i + 1 - window_days)]
+            for i in range(n_days)
+        }
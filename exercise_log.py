@@ -0,0 +1,729 @@
+"""
+exercise_log.py - Local exercise log and its index
+
+~/.vibereps/exercises.jsonl stays the source of truth (the Electron app appends
+to it directly). Next to it, a small SQLite index keeps per-day, per-exercise
+totals plus the byte offset of the last line it has seen, so readers only parse
+lines appended since the previous read instead of the whole log.
+
+exercises.jsonl only holds the current month. On the first append of a new
+month, older entries move to ~/.vibereps/segments/exercises-YYYY-MM.jsonl.gz.
+Each closed segment starts with a summary header line (per-day, per-exercise
+totals), so rebuilding the index never has to decompress old entries.
+
+Python writers append through `LogAppender`: whole lines in one O_APPEND
+write under an advisory lock, optionally batched (group commit).
+"""
+
+import atexit
+import gzip
+import hashlib
+import io
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single O_APPEND writes, no advisory lock
+    fcntl = None
+
+LOG_DIR = Path.home() / ".vibereps"
+LOG_FILE = LOG_DIR / "exercises.jsonl"
+SEGMENT_DIR_NAME = "segments"
+
+# When appends reach the disk: "always" (fsync every write), "interval"
+# (at most once per FSYNC_INTERVAL seconds) or "never" (left to the OS)
+FSYNC_POLICY = os.getenv("VIBEREPS_LOG_FSYNC", "never")
+FSYNC_INTERVAL = 1.0
+
+
+def timestamp_to_local_date(ts: str) -> str:
+    """Convert ISO timestamp to local YYYY-MM-DD date."""
+    # Fast paths for the two shapes writers actually produce
+    if len(ts) >= 16 and ts[4] == '-' and ts[7] == '-' and ts[10] == 'T':
+        if ts.endswith('Z'):
+            # Electron: UTC. Local date only depends on the minute
+            return _utc_minute_to_local_date(ts[:16])
+        if '+' not in ts and ts.count('-') == 2:
+            # Python hook: naive local time
+            return ts[:10]
+    return _parse_local_date(ts)
+
+
+@lru_cache(maxsize=4096)
+def _utc_minute_to_local_date(minute: str) -> str:
+    return _parse_local_date(minute + ':00Z')
+
+
+def _parse_local_date(ts: str) -> str:
+    try:
+        # Handle both UTC (with Z) and local (without Z) timestamps
+        if ts.endswith('Z'):
+            dt = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+        elif '+' in ts or ts.count('-') > 2:
+            # Has timezone info
+            dt = datetime.fromisoformat(ts)
+        else:
+            # No timezone, assume local
+            dt = datetime.fromisoformat(ts)
+            return dt.strftime('%Y-%m-%d')
+        # Convert to local time
+        local_dt = dt.astimezone()
+        return local_dt.strftime('%Y-%m-%d')
+    except (ValueError, AttributeError):
+        # Fallback: just split on T
+        return ts.split("T")[0] if "T" in ts else ts[:10]
+
+
+def parse_line(line: bytes):
+    """Parse one log line into an entry dict, or None for blank/bad/internal entries."""
+    try:
+        entry = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if not isinstance(entry, dict):
+        return None
+    exercise = entry.get("exercise", "unknown")
+    reps = entry.get("reps", 0)
+    # Skip internal states and zero-rep entries
+    if not isinstance(exercise, str) or exercise.startswith("_") or not isinstance(reps, int) or reps <= 0:
+        return None
+    return entry
+
+
+def line_date(line: bytes):
+    """Local YYYY-MM-DD of a raw log line, or None if it has no usable timestamp."""
+    try:
+        ts = json.loads(line).get("timestamp")
+    except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+        return None
+    if not isinstance(ts, str) or len(ts) < 7:
+        return None
+    return timestamp_to_local_date(ts)
+
+
+def line_month(line: bytes):
+    """Local YYYY-MM of a raw log line, or None if it has no usable timestamp."""
+    date = line_date(line)
+    return date[:7] if date else None
+
+
+def current_tz() -> str:
+    return "|".join(time.tzname)
+
+
+# ============== Segments ==============
+
+def segment_dir(log_file: Path = LOG_FILE) -> Path:
+    return log_file.parent / SEGMENT_DIR_NAME
+
+
+def list_segments(log_file: Path = LOG_FILE) -> list:
+    """Closed segment files, oldest first."""
+    directory = segment_dir(log_file)
+    if not directory.exists():
+        return []
+    return sorted(directory.glob(f"{log_file.stem}-*.jsonl.gz"))
+
+
+def read_segment_header(path: Path) -> dict:
+    """Summary header of a closed segment (first line only is decompressed)."""
+    with gzip.open(path, "rb") as f:
+        return json.loads(f.readline())
+
+
+def iter_segment_lines(path: Path):
+    """Raw entry lines of a closed segment (header skipped)."""
+    with gzip.open(path, "rb") as f:
+        f.readline()
+        for line in f:
+            yield line
+
+
+def summarize_lines(lines: list) -> dict:
+    """Per-day, per-exercise [reps, sets, duration] for a list of raw lines."""
+    days = {}
+    for line in lines:
+        entry = parse_line(line)
+        if not entry:
+            continue
+        date = timestamp_to_local_date(entry.get("timestamp", ""))
+        totals = days.setdefault(date, {}).setdefault(entry.get("exercise", "unknown"), [0, 0, 0])
+        totals[0] += entry["reps"]
+        totals[1] += 1
+        totals[2] += entry.get("duration", 0) or 0
+    return days
+
+
+def write_segment(path: Path, month: str, lines: list):
+    """
+    Write (or extend) a closed segment atomically, with a fresh summary header.
+
+    Lines the segment already has are skipped: a rotation that stopped after
+    writing segments but before replacing the active log left them in both,
+    and the next rotation moves them again.
+    """
+    lines = [line if line.endswith(b"\n") else line + b"\n" for line in lines]
+    if path.exists():
+        existing = list(iter_segment_lines(path))
+        seen = set(existing)
+        lines = existing + [line for line in lines if line not in seen]
+    header = {
+        "segment": month,
+        "tz": current_tz(),
+        "entries": len(lines),
+        "days": summarize_lines(lines)
+    }
+
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wb") as f:
+        f.write(json.dumps(header).encode() + b"\n")
+        f.writelines(lines)
+    os.replace(tmp, path)
+
+
+def _acquire_lock(lock_file: Path, stale_after: float = 30) -> bool:
+    """O_EXCL lock file, taken over if older than `stale_after` seconds."""
+    for _ in range(2):
+        try:
+            fd = os.open(str(lock_file), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - lock_file.stat().st_mtime < stale_after:
+                    return False
+                lock_file.unlink(missing_ok=True)
+            except OSError:
+                return False
+    return False
+
+
+def _first_month(log_file: Path):
+    """Month of the first timestamped entry in the active log."""
+    try:
+        with open(log_file, "rb") as f:
+            for _ in range(10):
+                line = f.readline()
+                if not line:
+                    break
+                month = line_month(line)
+                if month:
+                    return month
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def rotate_if_needed(log_file: Path = LOG_FILE, now: datetime = None) -> bool:
+    """
+    Move entries from previous months out of the active log into segments.
+
+    Entries that still belong to the current month are written to a new file
+    that replaces the active log while its append lock is held, so they stay
+    ahead of anything appended afterwards (readers rely on the log being in
+    time order). Returns True if anything was rotated.
+    """
+    current_month = (now or datetime.now()).strftime("%Y-%m")
+    directory = segment_dir(log_file)
+    first_month = _first_month(log_file)
+    if not first_month or first_month >= current_month:
+        return False
+
+    directory.mkdir(parents=True, exist_ok=True)
+    lock_file = directory / ".lock"
+    if not _acquire_lock(lock_file):
+        return False  # Someone else is rotating; the next append retries
+
+    try:
+        fd = os.open(str(log_file), os.O_RDONLY | os.O_CREAT, 0o644)
+        try:
+            # Let an in-progress locked append finish and hold off new ones;
+            # writers waiting on this lock notice the replace and reopen
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+
+            # Re-check under the lock
+            first_month = _first_month(log_file)
+            if not first_month or first_month >= current_month:
+                return False
+
+            with open(fd, "rb", closefd=False) as f:
+                data = f.read()
+
+            by_month = {}
+            carry = []
+            for line in data.splitlines(keepends=True):
+                month = line_month(line)
+                if month and month < current_month:
+                    by_month.setdefault(month, []).append(line)
+                elif line.strip():
+                    carry.append(line if line.endswith(b"\n") else line + b"\n")
+
+            for month, month_lines in sorted(by_month.items()):
+                write_segment(directory / f"{log_file.stem}-{month}.jsonl.gz", month, month_lines)
+
+            tmp = directory / f".{log_file.name}.tmp"
+            with open(tmp, "wb") as out:
+                out.writelines(carry)
+                # Unlocked writers (the Electron app) may have appended since the read
+                with open(fd, "rb", closefd=False) as f:
+                    f.seek(len(data))
+                    out.write(f.read())
+            os.replace(tmp, log_file)
+            return True
+        finally:
+            os.close(fd)  # Also releases the flock
+    finally:
+        lock_file.unlink(missing_ok=True)
+
+
+def seek_date(buf, date: str, lo: int = 0, hi: int = None) -> int:
+    """
+    Byte offset of the first line in `buf` whose local date is >= `date`.
+
+    Binary search over line boundaries: writers append in time order, so
+    local dates (compared after parsing, since the hook writes naive local
+    time and the Electron app UTC) never decrease along the file. Lines
+    without a timestamp are skipped over.
+    """
+    hi = len(buf) if hi is None else hi
+    while lo < hi:
+        # Start of the line containing the midpoint
+        start = max(lo, buf.rfind(b"\n", lo, (lo + hi) // 2) + 1)
+        pos = start
+        found = None
+        while pos < hi:
+            end = buf.find(b"\n", pos, hi)
+            end = hi if end == -1 else end + 1
+            found = line_date(buf[pos:end])
+            if found:
+                break
+            pos = end
+        if not found or found >= date:
+            hi = start
+        else:
+            lo = end
+    return lo
+
+
+def _iter_log_lines(log_file: Path, since: str = None):
+    """Raw lines of the active log, starting at the first line dated `since` (mmap, no full read)."""
+    try:
+        f = open(log_file, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as buf:
+            pos = seek_date(buf, since) if since else 0
+            while pos < size:
+                end = buf.find(b"\n", pos)
+                end = size if end == -1 else end + 1
+                yield buf[pos:end]
+                pos = end
+
+
+def iter_entries(log_file: Path = LOG_FILE, since: str = None, until: str = None):
+    """
+    Yield countable entries, closed segments first, then the active log.
+
+    With `since`/`until` (YYYY-MM-DD, inclusive), segments for other months are
+    skipped and only the matching byte range of the active log is decoded.
+    """
+    yield from iter_segment_entries(log_file, since, until)
+    yield from iter_log_entries(log_file, since, until)
+
+
+def iter_segment_entries(log_file: Path = LOG_FILE, since: str = None, until: str = None):
+    """Countable entries of the closed segments only, limited to [since, until] like `iter_entries`."""
+    ranged = bool(since or until)
+    for path in list_segments(log_file):
+        month = path.name[len(log_file.stem) + 1:][:7]
+        if (since and month < since[:7]) or (until and month > until[:7]):
+            continue
+        for line in iter_segment_lines(path):
+            entry = parse_line(line)
+            if entry and (not ranged or (since or "") <= _entry_date(entry) <= (until or "9999-99-99")):
+                yield entry
+
+
+def iter_log_entries(log_file: Path = LOG_FILE, since: str = None, until: str = None):
+    """Countable entries of the active log only, limited to [since, until] like `iter_entries`."""
+    ranged = bool(since or until)
+    for line in _iter_log_lines(log_file, since):
+        entry = parse_line(line)
+        if not entry:
+            continue
+        if ranged:
+            date = _entry_date(entry)
+            if until and date > until:
+                return  # Time-ordered: nothing later can be in range
+            if since and date < since:
+                continue
+        yield entry
+
+
+def read_appended(f, offset: int):
+    """
+    (entries, new offset) for complete lines after `offset` in an open log file.
+
+    A trailing line without its newline yet is left for the next call.
+    """
+    f.seek(offset)
+    data = f.read()
+    end = data.rfind(b"\n") + 1
+    entries = [entry for entry in map(parse_line, data[:end].splitlines()) if entry]
+    return entries, offset + end
+
+
+def _entry_date(entry: dict) -> str:
+    return timestamp_to_local_date(entry.get("timestamp", ""))
+
+
+# ============== Index ==============
+
+
+class ExerciseIndex:
+    """
+    Per-day, per-exercise totals for the local log, kept in SQLite.
+
+    Every read first calls `sync()`, which parses only the bytes appended
+    since the stored offset. Appends from any writer (this module, the
+    Electron app, hand edits at the end of the file) are picked up the same
+    way. The index is rebuilt if the log shrinks, the set of closed segments
+    changes, or the local time zone changes (dates are bucketed in local
+    time). Rebuilds read segment summary headers, not their entries.
+    """
+
+    def __init__(self, log_file: Path = LOG_FILE, index_file: Path = None):
+        self.log_file = Path(log_file)
+        # exercises.jsonl -> exercises.db
+        self.index_file = Path(index_file) if index_file else self.log_file.with_suffix(".db")
+        # (identity, offset) of the log as of the last sync: "dev:ino" and the
+        # byte offset the totals cover, for callers that then read appends
+        self.position = None
+        self.conn = sqlite3.connect(str(self.index_file), timeout=5, isolation_level=None)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS daily_totals (
+                date TEXT NOT NULL,
+                exercise TEXT NOT NULL,
+                reps INTEGER NOT NULL DEFAULT 0,
+                sets INTEGER NOT NULL DEFAULT 0,
+                duration INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (date, exercise)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get_meta(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value))
+        )
+
+    def _segments_signature(self) -> str:
+        return ",".join(f"{p.name}:{p.stat().st_size}" for p in list_segments(self.log_file))
+
+    def _reset(self):
+        """Reload totals from closed segments; the active log is re-read from offset 0."""
+        self.conn.execute("DELETE FROM daily_totals")
+        tz = current_tz()
+        for path in list_segments(self.log_file):
+            header = read_segment_header(path)
+            if header.get("tz") == tz:
+                for date, exercises in header.get("days", {}).items():
+                    for exercise, (reps, sets, duration) in exercises.items():
+                        self._add_totals(date, exercise, reps, sets, duration)
+            else:
+                # Summary was bucketed in another time zone - recount from entries
+                for line in iter_segment_lines(path):
+                    entry = parse_line(line)
+                    if entry:
+                        self._add(entry)
+        self._set_meta("offset", 0)
+        self._set_meta("tz", tz)
+        self._set_meta("segments", self._segments_signature())
+
+    @staticmethod
+    def _fingerprint(f, offset: int) -> str:
+        """Hash of the log's head and the bytes just before `offset`."""
+        f.seek(0)
+        head = f.read(min(offset, 4096))
+        tail_start = max(0, offset - 256)
+        f.seek(tail_start)
+        tail = f.read(offset - tail_start)
+        return hashlib.sha1(head + tail).hexdigest()
+
+    def sync(self) -> int:
+        """Fold lines appended since the last sync into the totals. Returns lines applied."""
+        # IMMEDIATE: concurrent syncs serialize on the offset instead of double counting
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            applied = 0
+            try:
+                f = open(self.log_file, "rb")
+                stat = os.fstat(f.fileno())
+                identity = f"{stat.st_dev}:{stat.st_ino}"
+            except FileNotFoundError:
+                f, identity = io.BytesIO(), ""
+
+            with f:
+                size = f.seek(0, os.SEEK_END)
+                offset = int(self._get_meta("offset", 0))
+
+                # Anything but a pure append since last time (truncated, replaced,
+                # edited in place, rotated) means the stored totals can't be trusted
+                if (size < offset
+                        or self._get_meta("identity", "") != identity
+                        or self._get_meta("fingerprint", "") != self._fingerprint(f, offset)
+                        or self._get_meta("tz") != current_tz()
+                        or self._get_meta("segments", "") != self._segments_signature()):
+                    self._reset()
+                    self._set_meta("identity", identity)
+                    offset = 0
+
+                if size > offset:
+                    f.seek(offset)
+                    data = f.read(size - offset)
+                    # Only consume complete lines; a partial last line waits for its newline
+                    end = data.rfind(b"\n") + 1
+                    for line in data[:end].splitlines():
+                        entry = parse_line(line)
+                        if entry:
+                            self._add(entry)
+                            applied += 1
+                    offset += end
+                    self._set_meta("offset", offset)
+
+                self._set_meta("fingerprint", self._fingerprint(f, offset))
+
+            self.conn.execute("COMMIT")
+            self.position = (identity, offset)
+            return applied
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _add(self, entry: dict):
+        self._add_totals(
+            timestamp_to_local_date(entry.get("timestamp", "")),
+            entry.get("exercise", "unknown"),
+            entry["reps"],
+            1,
+            entry.get("duration", 0) or 0
+        )
+
+    def _add_totals(self, date: str, exercise: str, reps: int, sets: int, duration: int):
+        self.conn.execute(
+            "INSERT INTO daily_totals (date, exercise, reps, sets, duration) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(date, exercise) DO UPDATE SET "
+            "reps = reps + excluded.reps, sets = sets + excluded.sets, duration = duration + excluded.duration",
+            (date, exercise, reps, sets, duration)
+        )
+
+    def daily_totals(self, since: str = None, until: str = None) -> dict:
+        """{date: {exercise: reps}} for dates in [since, until] (YYYY-MM-DD, inclusive)."""
+        self.sync()
+        query = "SELECT date, exercise, reps FROM daily_totals WHERE date >= ? AND date <= ? ORDER BY date"
+        by_date = {}
+        for date, exercise, reps in self.conn.execute(query, (since or "", until or "9999-99-99")):
+            by_date.setdefault(date, {})[exercise] = reps
+        return by_date
+
+    def totals_for_date(self, date: str) -> dict:
+        """{exercise: reps} for one date."""
+        return self.daily_totals(date, date).get(date, {})
+
+    def exercise_totals(self, since: str = None, until: str = None) -> dict:
+        """{exercise: reps} summed over dates in [since, until]."""
+        self.sync()
+        query = (
+            "SELECT exercise, SUM(reps) FROM daily_totals WHERE date >= ? AND date <= ? "
+            "GROUP BY exercise"
+        )
+        return dict(self.conn.execute(query, (since or "", until or "9999-99-99")).fetchall())
+
+
+# ============== Appending ==============
+
+
+def repair_tail(fd: int) -> bool:
+    """
+    Terminate a torn last line (a writer crashed mid-line) with a newline.
+
+    Otherwise the next entry would be glued onto it and both lost. The torn
+    line itself stays in the file and is skipped by readers as unparseable.
+    """
+    size = os.fstat(fd).st_size
+    if size == 0:
+        return False
+    os.lseek(fd, size - 1, os.SEEK_SET)
+    if os.read(fd, 1) == b"\n":
+        return False
+    os.write(fd, b"\n")  # O_APPEND: lands at the end regardless of the seek
+    return True
+
+
+def write_lines(log_file: Path, data: bytes, fsync: bool = False):
+    """
+    Append complete lines to the log in one write() under an exclusive flock.
+
+    O_APPEND keeps lines from unlocked writers (the Electron app) from
+    interleaving with ours; the lock serializes Python writers and rotation.
+    """
+    log_file.parent.mkdir(exist_ok=True)
+    while True:
+        fd = os.open(str(log_file), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                # Rotation may have replaced the file while we waited for the lock
+                try:
+                    if os.fstat(fd).st_ino != os.stat(log_file).st_ino:
+                        continue
+                except FileNotFoundError:
+                    continue
+
+            repair_tail(fd)
+            view = memoryview(data)
+            while view:
+                # One write for the whole batch; only loops on a short write
+                view = view[os.write(fd, view):]
+            if fsync:
+                os.fsync(fd)
+            return
+        finally:
+            os.close(fd)  # Also releases the flock
+
+
+class LogAppender:
+    """
+    Appends entries to the log, optionally batching them (group commit).
+
+    With `flush_interval` 0 every `append()` is written straight away. With a
+    positive interval, entries are buffered and written together after that
+    many seconds or once `max_batch` are pending, so a busy writer pays one
+    lock, write and index sync per batch. Pending entries are flushed at exit.
+    """
+
+    def __init__(self, log_file: Path = LOG_FILE, flush_interval: float = 0.0,
+                 max_batch: int = 100, fsync: str = FSYNC_POLICY):
+        self.log_file = Path(log_file)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._last_fsync = 0.0
+        if flush_interval > 0:
+            atexit.register(self.flush)
+
+    def append(self, entry: dict) -> bool:
+        """Queue one entry. Returns False if a write it triggered failed."""
+        line = (json.dumps(entry) + "\n").encode()
+        with self._lock:
+            self._pending.append(line)
+            if self.flush_interval <= 0 or len(self._pending) >= self.max_batch:
+                return self._flush()
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return True
+
+    def extend(self, entries, keep_on_failure: bool = True) -> bool:
+        """
+        Write several entries as one batch. Returns False if the write failed;
+        the entries then stay queued, unless `keep_on_failure` is False (for
+        callers that store them elsewhere instead).
+        """
+        lines = [(json.dumps(entry) + "\n").encode() for entry in entries]
+        with self._lock:
+            self._pending.extend(lines)
+            if self._flush():
+                return True
+            if lines and not keep_on_failure:
+                del self._pending[-len(lines):]
+            return False
+
+    def flush(self) -> bool:
+        """Write everything pending. Returns False if the write failed (entries stay queued)."""
+        with self._lock:
+            return self._flush()
+
+    def close(self):
+        self.flush()
+        if self.flush_interval > 0:
+            atexit.unregister(self.flush)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _flush(self) -> bool:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return True
+
+        try:
+            rotate_if_needed(self.log_file)
+        except OSError:
+            pass  # Rotation is housekeeping; never lose entries over it
+
+        now = time.monotonic()
+        fsync = self.fsync == "always" or (
+            self.fsync == "interval" and now - self._last_fsync >= FSYNC_INTERVAL
+        )
+        try:
+            write_lines(self.log_file, b"".join(self._pending), fsync=fsync)
+        except OSError:
+            return False
+        self._pending = []
+        if fsync:
+            self._last_fsync = now
+
+        # The log is already written; a stale index catches up on its next read
+        try:
+            with ExerciseIndex(self.log_file) as index:
+                index.sync()
+        except (sqlite3.Error, OSError):
+            pass
+        return True
+
+
+def append_entry(entry: dict, log_file: Path = LOG_FILE) -> bool:
+    """Append one entry to the JSONL log and fold it into the index."""
+    return LogAppender(log_file).append(entry)
@@ -0,0 +1,179 @@
+"""
+exercise_trace.py - Recorded pose traces for replaying sessions offline
+
+A trace is one exercise attempt as the UI saw it: every pose frame's 33
+MediaPipe landmarks, in ~/.vibereps/traces/<started>-<exercise>-<id>.trace.
+Frames are fixed-size little-endian records after a fixed-size header, so
+a trace can be memory-mapped straight into arrays:
+
+    0            b"VRTRACE1"
+    8            JSON header (exercise, detection thresholds, reps, ...),
+                 space-padded to HEADER_SIZE
+    HEADER_SIZE  one record per frame (RECORD_SIZE = 536 bytes):
+                 float64 timestamp (epoch seconds), then
+                 33 x (x, y, z, visibility) float32
+
+Frames are appended as they arrive; the frame count is the data size over
+the record size. The header is rewritten in place when the trace is
+finished, tagging it with the reps the UI counted.
+
+    header, timestamps, landmarks = load_trace(path)   # numpy memmaps
+    python -m pose_detection count exercises/squats.json path.trace
+"""
+
+import json
+import os
+import re
+import struct
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from exercise_log import LOG_DIR
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TRACE_DIR = LOG_DIR / "traces"
+MAGIC = b"VRTRACE1"
+FORMAT_VERSION = 1
+HEADER_SIZE = 4096  # Page-aligned frames
+NUM_LANDMARKS = 33
+RECORD = struct.Struct(f"<d{NUM_LANDMARKS * 4}f")
+RECORD_SIZE = RECORD.size
+# Longest trace kept: 30 minutes at 30 fps (~29 MB)
+MAX_FRAMES = 30 * 60 * 30
+
+EXERCISE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class TraceError(ValueError):
+    """Bad trace data or an unusable trace file."""
+
+
+def record_dtype():
+    """numpy dtype of one frame record."""
+    return np.dtype([("timestamp", "<f8"), ("landmarks", "<f4", (NUM_LANDMARKS, 4))])
+
+
+def _write_header(path: Path, header: dict, create: bool = False):
+    raw = MAGIC + json.dumps(header, separators=(",", ":")).encode()
+    if len(raw) > HEADER_SIZE:
+        raise TraceError("trace header too large")
+    flags = os.O_WRONLY | (os.O_CREAT | os.O_EXCL if create else 0)
+    fd = os.open(path, flags, 0o600)
+    try:
+        os.write(fd, raw.ljust(HEADER_SIZE, b" "))
+    finally:
+        os.close(fd)
+
+
+def read_header(path) -> dict:
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE or not raw.startswith(MAGIC):
+        raise TraceError(f"not a trace file: {path}")
+    try:
+        return json.loads(raw[len(MAGIC):].rstrip(b" "))
+    except ValueError:
+        raise TraceError(f"corrupt trace header: {path}")
+
+
+def frame_count(path) -> int:
+    """Complete frames in a trace (a torn last record is not counted)."""
+    return max(0, (os.stat(path).st_size - HEADER_SIZE) // RECORD_SIZE)
+
+
+def create_trace(exercise: str, detection: dict = None, mode: str = None,
+                 trace_dir: Path = TRACE_DIR) -> Path:
+    """Start an empty trace for one exercise attempt; returns its path."""
+    if not isinstance(exercise, str) or not EXERCISE_ID.match(exercise):
+        raise TraceError(f"invalid exercise id: {exercise!r}")
+    trace_dir = Path(trace_dir)
+    trace_dir.mkdir(parents=True, exist_ok=True)
+    started = datetime.now()
+    trace_id = uuid.uuid4().hex[:12]
+    path = trace_dir / f"{started:%Y%m%d-%H%M%S}-{exercise}-{trace_id}.trace"
+    _write_header(path, {
+        "version": FORMAT_VERSION,
+        "id": trace_id,
+        "exercise": exercise,
+        "mode": mode,
+        "detection": detection,
+        "started": started.isoformat(),
+        "finished": None,
+        "reps": None,
+        "frames": None,
+        "landmarks": NUM_LANDMARKS,
+        "record": "<f8 timestamp, <f4 landmarks[33][x, y, z, visibility]"
+    }, create=True)
+    return path
+
+
+def append_frames(path, data: bytes) -> int:
+    """Append whole frame records; returns the trace's frame count."""
+    if len(data) % RECORD_SIZE:
+        raise TraceError(f"frame data must be a multiple of {RECORD_SIZE} bytes, got {len(data)}")
+    frames = frame_count(path)
+    if frames + len(data) // RECORD_SIZE > MAX_FRAMES:
+        raise TraceError(f"trace is limited to {MAX_FRAMES} frames")
+
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+    try:
+        # Drop a torn record from an interrupted upload so frames stay aligned
+        end = HEADER_SIZE + frames * RECORD_SIZE
+        if os.fstat(fd).st_size != end:
+            os.ftruncate(fd, end)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    return frames + len(data) // RECORD_SIZE
+
+
+def finish_trace(path, reps: int = None, **tags) -> dict:
+    """Tag a trace with its rep count and frame total; returns the header."""
+    if reps is not None and (type(reps) is not int or reps < 0):
+        raise TraceError(f"invalid rep count: {reps!r}")
+    header = read_header(path)
+    header.update(tags)
+    header.update(reps=reps, frames=frame_count(path), finished=datetime.now().isoformat())
+    _write_header(Path(path), header)
+    return header
+
+
+def list_traces(trace_dir: Path = TRACE_DIR) -> list:
+    """Trace paths, oldest first."""
+    trace_dir = Path(trace_dir)
+    return sorted(trace_dir.glob("*.trace")) if trace_dir.is_dir() else []
+
+
+def iter_frames(path):
+    """(timestamp, 132 landmark floats) per frame, without numpy."""
+    with open(path, "rb") as f:
+        f.seek(HEADER_SIZE)
+        while True:
+            raw = f.read(RECORD_SIZE)
+            if len(raw) < RECORD_SIZE:
+                return
+            values = RECORD.unpack(raw)
+            yield values[0], values[1:]
+
+
+def load_trace(path):
+    """
+    (header, timestamps, landmarks) with landmarks shaped (frames, 33, 4).
+
+    Both arrays are read-only views of a memory map of the file.
+    """
+    if np is None:
+        raise ImportError("load_trace needs numpy (or use iter_frames)")
+    header = read_header(path)
+    frames = frame_count(path)
+    if not frames:
+        return header, np.zeros(0, "<f8"), np.zeros((0, NUM_LANDMARKS, 4), "<f4")
+    records = np.memmap(path, dtype=record_dtype(), mode="r", offset=HEADER_SIZE, shape=(frames,))
+    return header, records["timestamp"], records["landmarks"]
@@ -118,6 +118,7 @@ Environment variables:
   VIBEREPS_DISABLED      Set to 1 to disable tracking
   VIBEREPS_API_URL       Remote server URL for logging
   VIBEREPS_API_KEY       API key for remote server
+  VIBEREPS_TRACE         Set to 1 to record pose landmarks to ~/.vibereps/traces
 """)
     sys.exit(0)
 
@@ -229,6 +230,7 @@ VIBEREPS_API_URL = os.getenv("VIBEREPS_API_URL", "")  # e.g., "https://vibereps.
 VIBEREPS_API_KEY = os.getenv("VIBEREPS_API_KEY", "")  # Your API key
 VIBEREPS_EXERCISES = os.getenv("VIBEREPS_EXERCISES", "")  # Comma-separated: "squats,pushups,jumping_jacks"
 VIBEREPS_DANGEROUSLY_SKIP_LEG_DAY = os.getenv("VIBEREPS_DANGEROUSLY_SKIP_LEG_DAY", "")  # Set to 1 to --dangerously-skip-leg-day
+VIBEREPS_TRACE = os.getenv("VIBEREPS_TRACE", "")  # Set to 1 to record pose landmarks for offline replay
 
 # Exercises that require legs (filtered out when VIBEREPS_DANGEROUSLY_SKIP_LEG_DAY=1)
 LEG_EXERCISES = {"squats", "calf_raises", "high_knees", "jumping_jacks"}
@@ -473,27 +475,20 @@ def open_small_window(url: str, width: int = 340, height: int = 700):
 
 
 def log_to_local(exercise: str, reps: int, duration: int = 0, mode: str = "normal") -> bool:
-    """Log exercise data to local JSONL file for ccusage integration."""
+    """Log exercise data to local JSONL file (and its index) for ccusage integration."""
     from datetime import datetime
-
-    log_dir = Path.home() / ".vibereps"
-    log_file = log_dir / "exercises.jsonl"
+    from exercise_log import append_entry
+
+    entry = {
+        "timestamp": datetime.now().isoformat(),
+        "exercise": exercise,
+        "reps": reps,
+        "duration": duration,
+        "mode": mode
+    }
 
     try:
-        log_dir.mkdir(exist_ok=True)
-
-        entry = {
-            "timestamp": datetime.now().isoformat(),
-            "exercise": exercise,
-            "reps": reps,
-            "duration": duration,
-            "mode": mode
-        }
-
-        with open(log_file, "a") as f:
-            f.write(json.dumps(entry) + "\n")
-
-        return True
+        return append_entry(entry)
     except Exception:
         return False
 
@@ -639,9 +634,11 @@ class ExerciseHTTPHandler(BaseHTTPRequestHandler):
     claude_complete = False
     quick_mode = False
     claude_sessions = {}  # {session_id: {context: {...}, last_seen: timestamp}}
+    traces = {}  # {trace_id: path} for traces recorded by this server
     tracker = None  # Reference to ExerciseTrackerHook for shutdown coordination
     SESSION_TIMEOUT = 1800  # 30 minutes - remove stale sessions
     COMPLETED_SESSION_TIMEOUT = 120  # 2 minutes - remove completed sessions faster
+    MAX_TRACE_CHUNK = 4 * 1024 * 1024  # Largest /trace/frames upload (~260s of frames at 30fps)
 
     def do_GET(self):
         """Serve the exercise tracker HTML and exercise definitions"""
@@ -664,7 +661,8 @@ class ExerciseHTTPHandler(BaseHTTPRequestHandler):
             status = {
                 "claude_complete": ExerciseHTTPHandler.claude_complete,
                 "exercise_complete": ExerciseHTTPHandler.exercise_complete,
-                "paused": is_paused()
+                "paused": is_paused(),
+                "trace": bool(VIBEREPS_TRACE)
             }
             self.wfile.write(json.dumps(status).encode())
         elif parsed_path == '/exercises':
@@ -809,9 +807,87 @@ class ExerciseHTTPHandler(BaseHTTPRequestHandler):
                     ExerciseHTTPHandler.tracker.shutdown_requested = True
             except Exception:
                 pass  # May fail if connection closed
+        elif self.path.startswith('/trace/'):
+            self._handle_trace()
         else:
             self.send_error(404)
 
+    def _handle_trace(self):
+        """
+        Record pose landmarks for offline replay (VIBEREPS_TRACE=1).
+
+        POST /trace/start            {"exercise", "mode"?} -> {"trace": id}
+        POST /trace/frames?trace=id  binary frame records (see exercise_trace.py)
+        POST /trace/finish           {"trace", "reps"}
+        """
+        from urllib.parse import urlparse, parse_qs
+        from exercise_trace import TraceError, append_frames, create_trace, finish_trace
+
+        parsed = urlparse(self.path)
+        if not VIBEREPS_TRACE:
+            self.send_error(404, "Tracing is off (set VIBEREPS_TRACE=1)")
+            return
+
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length > ExerciseHTTPHandler.MAX_TRACE_CHUNK:
+            self.send_error(413, "Trace chunk too large")
+            return
+        body = self.rfile.read(content_length)
+
+        try:
+            if parsed.path == '/trace/frames':
+                trace_id = parse_qs(parsed.query).get('trace', [''])[0]
+                path = ExerciseHTTPHandler.traces.get(trace_id)
+                if path is None:
+                    self.send_error(404, f"Unknown trace: {trace_id}")
+                    return
+                result = {"trace": trace_id, "frames": append_frames(path, body)}
+            elif parsed.path == '/trace/start':
+                data = json.loads(body.decode() or '{}')
+                if not isinstance(data, dict):
+                    raise TraceError("expected a JSON object")
+                exercise = data.get("exercise", "")
+                mode = data.get("mode")
+                if mode is not None and not isinstance(mode, str):
+                    raise TraceError("mode must be a string")
+                # Tag the trace with the thresholds it was recorded under
+                definition = self.get_exercise_file(f"{exercise}.json") if isinstance(exercise, str) else None
+                try:
+                    definition = json.loads(definition) if definition else None
+                except ValueError:
+                    definition = None  # A broken definition shouldn't stop the recording
+                detection = definition.get("detection") if isinstance(definition, dict) else None
+                path = create_trace(exercise, detection, mode)
+                trace_id = path.stem.rsplit('-', 1)[-1]
+                ExerciseHTTPHandler.traces[trace_id] = path
+                result = {"trace": trace_id}
+            elif parsed.path == '/trace/finish':
+                data = json.loads(body.decode() or '{}')
+                if not isinstance(data, dict):
+                    raise TraceError("expected a JSON object")
+                trace_id = str(data.get("trace", ""))
+                path = ExerciseHTTPHandler.traces.get(trace_id)
+                if path is None:
+                    self.send_error(404, f"Unknown trace: {trace_id}")
+                    return
+                header = finish_trace(path, reps=data.get("reps"))
+                del ExerciseHTTPHandler.traces[trace_id]
+                result = {"trace": trace_id, "frames": header["frames"], "reps": header["reps"]}
+            else:
+                self.send_error(404)
+                return
+        except (TraceError, ValueError) as e:
+            self.send_error(400, str(e))
+            return
+        except OSError as e:
+            self.send_error(500, str(e))
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(result).encode())
+
     def log_message(self, format, *args):
         """Suppress server logs"""
         pass
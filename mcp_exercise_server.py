@@ -1,13 +1,41 @@
 #!/usr/bin/env python3
 """
 MCP server for exercise tracking data and configuration
+
+State lives in a snapshot (~/.claude_exercise_data.json) plus an append-only
+journal of changes since it was written (~/.claude_exercise_data.journal).
+Each logged session or goal change is one small journal append; startup
+loads the snapshot and replays the journal, and every SNAPSHOT_EVERY changes
+the journal is folded into a fresh snapshot.
+
+Resources can be filtered and paged (exercise://sessions?from=&to=&exercise=
+&cursor=&limit=, exercise://stats/daily?from=&to=&exercise=) and are served
+from the in-memory indexes. Subscribed clients get resources/updated
+notifications when sets are logged, from here or by the hook and app.
+
+Tools only change memory. Writes happen behind them on a background thread:
+changes made within WRITE_DELAY seconds go to disk in one append, snapshots
+are written there too, and anything pending is flushed on shutdown.
+
+Sessions logged by the hook and the Electron app come from the canonical
+~/.vibereps/exercises.jsonl, read incrementally: each tool call only parses
+lines appended since the previous one, on a worker thread. In-memory state is
+only changed on the event loop; the writer thread hands changes back to it.
 """
 
 import asyncio
+import atexit
 import json
+import os
+import sys
+import threading
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
@@ -15,29 +43,177 @@ from mcp.types import (
     Tool,
     TextContent,
     Resource,
+    ResourceTemplate,
     GetPromptResult,
     PromptMessage,
     INVALID_PARAMS,
     INTERNAL_ERROR
 )
 
+from exercise_log import LOG_FILE, LogAppender, iter_segment_entries, list_segments, read_appended, write_lines
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks
+    fcntl = None
+
+# Journal records before they are folded into a new snapshot
+SNAPSHOT_EVERY = 500
+# Seconds changes are held so a burst of tool calls is written together
+WRITE_DELAY = 0.5
+# Seconds between checks of the exercise log while a client is subscribed
+SUBSCRIPTION_POLL = 1.0
+# Page size for exercise://sessions (default and maximum)
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+EXERCISES_DIR = Path(__file__).parent / "exercises"
+# Used when the exercise definitions aren't next to the server
+FALLBACK_EXERCISES = ["squats", "pushups", "jumping_jacks"]
+# Recent sessions per exercise that difficulty adjustment follows
+RECENT_WINDOW = 10
+
+
+class ExerciseCatalog:
+    """Exercise definitions from exercises/*.json, reloaded when a file changes"""
+
+    def __init__(self, exercises_dir: Path = EXERCISES_DIR):
+        self.exercises_dir = exercises_dir
+        self.signature = None
+        self.exercises = {}  # id -> definition, in file name order
+
+    def refresh(self) -> Dict[str, Dict]:
+        """Current definitions; only re-parses when a file was added, removed or modified"""
+        try:
+            files = sorted(
+                (entry.name, entry.stat().st_mtime_ns)
+                for entry in os.scandir(self.exercises_dir)
+                if entry.name.endswith(".json") and not entry.name.startswith("_")
+            )
+        except OSError:
+            files = []
+        if files == self.signature:
+            return self.exercises
+
+        exercises = {}
+        for name, _ in files:
+            try:
+                definition = json.loads((self.exercises_dir / name).read_text())
+            except (OSError, ValueError) as e:
+                print(f"Error loading exercise {name}: {e}", file=sys.stderr)
+                continue
+            if isinstance(definition, dict):
+                exercises[definition.get("id") or name[:-5]] = definition
+        if not exercises:
+            exercises = {exercise: {"id": exercise} for exercise in FALLBACK_EXERCISES}
+
+        self.signature = files
+        self.exercises = exercises
+        return exercises
+
+    def ids(self) -> List[str]:
+        return list(self.refresh())
+
+    def normal_reps(self, exercise: str) -> int:
+        """Standard set size for an exercise (10 when unknown)"""
+        reps = self.refresh().get(exercise, {}).get("reps", {})
+        return reps.get("normal", 10) if isinstance(reps, dict) else 10
+
+
 class ExerciseTrackerMCP:
     def __init__(self):
         self.server = Server("exercise-tracker")
         self.data_file = Path.home() / ".claude_exercise_data.json"
+        self.journal_file = self.data_file.with_suffix(".journal")
+        self.journal_records = 0
+        self.catalog = ExerciseCatalog()
+
+        # Write-behind: journal lines and log entries waiting for the writer thread
+        self.pending_records = []
+        self.pending_log = []
+        self.write_lock = threading.Lock()  # Guards the pending lists and write_timer
+        self.flush_lock = threading.Lock()  # One writer at a time
+        self.write_timer = None
+        # Event loop that owns the in-memory state (set by main); the writer
+        # thread hands state changes to it instead of making them itself
+        self.loop = None
+
+        # Per local day: {exercise: reps} and {exercise: sessions}
+        self.day_totals = {}
+        self.day_sessions = {}
+
+        # Sessions sorted by time (epoch seconds), and per exercise the sorted
+        # times and sessions with running rep totals: prefix[i] = reps of the
+        # first i sessions
+        self.session_times = array("d")
+        self.sessions_by_time = []
+        self.exercise_times = {}
+        self.exercise_sessions = {}
+        self.exercise_prefix = {}
+        self.time_index_sorted = True
+
+        # Bumped on every indexed session / goal change, for subscriptions
+        self.sessions_version = 0
+        self.goals_version = 0
+        self.subscriptions = set()
+        self.subscriber = None  # Client session to notify
+        self.watch_task = None
+
+        # Sessions from the canonical exercise log (segments + active log)
+        self.log_file = LOG_FILE
+        self.log_entries = []
+        self.log_totals = {}
+        self.log_offset = 0
+        self.log_identity = False  # Not read yet
+        self.log_segments = None
+        self.log_lock = asyncio.Lock()  # One log sync at a time
+        # Sessions logged here that haven't been read back from the log yet
+        self.log_appender = LogAppender(self.log_file)
+        self.unsynced = {}
+
         self.exercise_data = self.load_data()
+        self.sync_log()
+        atexit.register(self.close)
 
         # Register MCP endpoints
         self.setup_handlers()
 
     def load_data(self) -> Dict:
-        """Load exercise history from file"""
+        """Load the snapshot and replay the journal on top of it"""
+        data = self.load_snapshot()
+        try:
+            if not self.journal_file.exists():
+                self.new_journal()
+            with open(self.journal_file, "rb") as f:
+                journal_id, records = self.parse_journal(f.read())
+        except OSError as e:
+            print(f"Error loading journal: {e}", file=sys.stderr)
+            return data
+
+        if journal_id is None or journal_id != data.get("folded_journal"):
+            for record in records:
+                self.apply_record(data, record)
+            self.journal_records = len(records)
+        else:
+            # A crash between writing a snapshot and starting the next journal
+            # leaves one the snapshot already contains
+            try:
+                self.new_journal()
+            except OSError as e:
+                print(f"Error starting journal: {e}", file=sys.stderr)
+
+        if self.journal_records >= SNAPSHOT_EVERY:
+            return self.save_data() or data
+        return data
+
+    def load_snapshot(self) -> Dict:
+        """Load the last snapshot (full state as of its journal)"""
         if self.data_file.exists():
             try:
                 with open(self.data_file) as f:
                     return json.load(f)
             except Exception as e:
-                print(f"Error loading data: {e}")
+                print(f"Error loading data: {e}", file=sys.stderr)
 
         return {
             "history": [],
@@ -54,13 +230,310 @@ class ExerciseTrackerMCP:
             }
         }
 
-    def save_data(self):
-        """Persist exercise data"""
+    @staticmethod
+    def parse_journal(raw: bytes):
+        """(journal id, records) from journal bytes; torn or bad lines are skipped"""
+        journal_id = None
+        records = []
+        for line in raw.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict):
+                continue
+            if "journal" in record:
+                journal_id = record["journal"]
+            elif "op" in record:
+                records.append(record)
+        return journal_id, records
+
+    @staticmethod
+    def apply_record(data: Dict, record: Dict):
+        """Apply one journal record to the state"""
+        if record["op"] == "log":
+            session = record["session"]
+            data["history"].append(session)
+            totals = data["total_reps"]
+            totals[session["exercise"]] = totals.get(session["exercise"], 0) + session["reps"]
+        elif record["op"] == "goal":
+            data["goals"][record["key"]] = record["value"]
+
+    def record(self, record: Dict):
+        """Apply a change in memory and queue it for the journal"""
+        self.apply_record(self.exercise_data, record)
+        if record["op"] == "log":
+            self.index_session(record["session"])
+        self.queue_write(self.pending_records, (json.dumps(record) + "\n").encode())
+
+    def queue_write(self, pending: list, item):
+        """Hand a write to the writer thread; a burst within WRITE_DELAY shares one write"""
+        with self.write_lock:
+            pending.append(item)
+            if self.write_timer is None:
+                self.write_timer = threading.Timer(WRITE_DELAY, self.flush)
+                self.write_timer.daemon = True
+                self.write_timer.start()
+
+    def flush(self):
+        """Write queued changes (writer thread, and on shutdown)"""
+        with self.flush_lock:
+            with self.write_lock:
+                if self.write_timer is not None:
+                    self.write_timer.cancel()
+                    self.write_timer = None
+                lines, self.pending_records = self.pending_records, []
+                entries, self.pending_log = self.pending_log, []
+
+            if entries and not self.log_appender.extend(entries, keep_on_failure=False):
+                # Journal them instead, like sessions logged before the shared
+                # log, so the snapshot keeps them across a restart
+                print("Error writing exercise log; journaling the sessions instead", file=sys.stderr)
+                sessions = [{key: value for key, value in entry.items() if key != "mode"} for entry in entries]
+                lines += [(json.dumps({"op": "log", "session": session}) + "\n").encode() for session in sessions]
+                self.call_on_loop(self.move_to_history, sessions)
+
+            if lines:
+                try:
+                    # One locked append per burst; survives a concurrent compaction
+                    write_lines(self.journal_file, b"".join(lines))
+                    self.journal_records += len(lines)
+                except OSError as e:
+                    print(f"Error writing journal: {e}", file=sys.stderr)
+                    with self.write_lock:
+                        self.pending_records[:0] = lines  # Retried on the next flush
+            if self.journal_records >= SNAPSHOT_EVERY:
+                self.save_data()
+
+    def move_to_history(self, sessions: List[Dict]):
+        """Count unwritten log sessions as journaled history instead (already indexed)"""
+        for session in sessions:
+            self.apply_record(self.exercise_data, {"op": "log", "session": session})
+            self.unsynced.pop((session["timestamp"], session["exercise"]), None)
+
+    def call_on_loop(self, callback, *args):
+        """Run a state change on the event loop's thread (directly if there is no loop any more)"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self.loop is not None and running is not self.loop:
+            try:
+                self.loop.call_soon_threadsafe(callback, *args)
+                return
+            except RuntimeError:
+                pass  # Loop closed: shutting down, nothing else touches the state
+        callback(*args)
+
+    def close(self):
+        """Flush everything pending; called when the server stops"""
+        self.flush()
+        atexit.unregister(self.close)
+
+    def new_journal(self) -> str:
+        """Start an empty journal under a new id (atomic replace)"""
+        journal_id = uuid.uuid4().hex
+        tmp = self.journal_file.with_name(self.journal_file.name + ".tmp")
+        tmp.write_text(json.dumps({"journal": journal_id}) + "\n")
+        os.replace(tmp, self.journal_file)
+        return journal_id
+
+    def save_data(self) -> Optional[Dict]:
+        """
+        Fold the journal into a new snapshot and start a fresh journal.
+
+        Only touches disk (it runs on the writer thread); the state in memory
+        already has every change. Returns the folded state.
+        """
         try:
-            with open(self.data_file, 'w') as f:
-                json.dump(self.exercise_data, f, indent=2)
+            with open(self.journal_file, "rb") as f:
+                # Appenders (other server instances too) wait for this lock,
+                # then see the journal was replaced and reopen it
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+                # Rebuild from disk so changes journaled by other instances are kept
+                data = self.load_snapshot()
+                journal_id, records = self.parse_journal(f.read())
+                if journal_id is None or journal_id != data.get("folded_journal"):
+                    for record in records:
+                        self.apply_record(data, record)
+                data["folded_journal"] = journal_id
+
+                tmp = self.data_file.with_name(self.data_file.name + ".tmp")
+                with open(tmp, "w") as out:
+                    json.dump(data, out, separators=(",", ":"))
+                os.replace(tmp, self.data_file)
+                self.new_journal()
+
+            self.journal_records = 0
+            return data
         except Exception as e:
-            print(f"Error saving data: {e}")
+            print(f"Error saving data: {e}", file=sys.stderr)
+            return None
+
+    def sync_log(self):
+        """Ingest lines appended to the canonical exercise log since the last call"""
+        self.apply_log_changes(self.read_log_changes())
+
+    async def sync_log_async(self):
+        """`sync_log` with the disk reads on a worker thread, so the event loop doesn't wait on them"""
+        async with self.log_lock:
+            changes = await asyncio.to_thread(self.read_log_changes)
+            self.apply_log_changes(changes)
+
+    def read_log_changes(self):
+        """
+        Read what changed in the canonical log since the last sync, without
+        touching any state: (reset, identity, segments, segment entries,
+        appended entries, new offset), or None if the log can't be read.
+        """
+        try:
+            st = os.stat(self.log_file)
+            identity = (st.st_dev, st.st_ino)
+        except FileNotFoundError:
+            st, identity = None, None
+        except OSError as e:
+            print(f"Error reading exercise log: {e}", file=sys.stderr)
+            return None
+
+        try:
+            segments = [(p.name, p.stat().st_size) for p in list_segments(self.log_file)]
+        except OSError:
+            segments = self.log_segments
+
+        # First read, or the log was rotated or rewritten: start over
+        reset = (identity != self.log_identity or segments != self.log_segments
+                 or (st and st.st_size < self.log_offset))
+        offset = 0 if reset else self.log_offset
+        segment_entries = []
+        if reset:
+            try:
+                segment_entries = list(iter_segment_entries(self.log_file))
+            except (OSError, EOFError) as e:
+                print(f"Error reading exercise log segments: {e}", file=sys.stderr)
+
+        entries = []
+        if st is not None and st.st_size != offset:
+            try:
+                with open(self.log_file, "rb") as f:
+                    entries, offset = read_appended(f, offset)
+            except OSError as e:
+                print(f"Error reading exercise log: {e}", file=sys.stderr)
+        return reset, identity, segments, segment_entries, entries, offset
+
+    def apply_log_changes(self, changes):
+        """Apply what `read_log_changes` found to the sessions and indexes"""
+        if changes is None:
+            return
+        reset, identity, segments, segment_entries, entries, offset = changes
+        if reset:
+            self.log_entries = []
+            self.log_totals = {}
+            self.log_identity = identity
+            self.log_segments = segments
+            self.rebuild_day_index()
+            for entry in segment_entries:
+                self.add_log_entry(entry)
+        self.log_offset = offset
+        for entry in entries:
+            self.add_log_entry(entry)
+
+    def add_log_entry(self, entry: Dict):
+        """Add one exercise log entry as a session (timestamps as naive local time)"""
+        try:
+            ts = datetime.fromisoformat(str(entry.get("timestamp", "")).replace("Z", "+00:00"))
+        except ValueError:
+            return
+        if ts.tzinfo is not None:
+            # The Electron app logs UTC
+            ts = ts.astimezone().replace(tzinfo=None)
+
+        session = {
+            "timestamp": ts.isoformat(),
+            "exercise": entry["exercise"],
+            "reps": entry["reps"],
+            "duration": entry.get("duration", 0)
+        }
+        # Logged here: already indexed when it was logged
+        logged_here = self.unsynced.pop((session["timestamp"], session["exercise"]), None)
+        self.log_entries.append(session)
+        self.log_totals[session["exercise"]] = self.log_totals.get(session["exercise"], 0) + session["reps"]
+        if logged_here is None:
+            self.index_session(session)
+
+    def index_session(self, session: Dict):
+        """Add a session to the per-day and time indexes"""
+        day = session["timestamp"][:10]  # Naive local time
+        exercise = session["exercise"]
+        totals = self.day_totals.setdefault(day, {})
+        totals[exercise] = totals.get(exercise, 0) + session["reps"]
+        sessions = self.day_sessions.setdefault(day, {})
+        sessions[exercise] = sessions.get(exercise, 0) + 1
+        self.sessions_version += 1
+
+        try:
+            t = datetime.fromisoformat(session["timestamp"]).timestamp()
+        except ValueError:
+            return
+
+        # Sessions almost always arrive in time order. An older one (e.g.
+        # history logged here before the shared log) is appended anyway and
+        # the index re-sorted once before the next query.
+        times = self.session_times
+        if times and t < times[-1]:
+            self.time_index_sorted = False
+        times.append(t)
+        self.sessions_by_time.append(session)
+        if self.time_index_sorted:
+            self.index_exercise_time(t, session)
+
+    def index_exercise_time(self, t: float, session: Dict):
+        """Append a session (latest so far for its exercise) to the per-exercise index"""
+        exercise = session["exercise"]
+        prefix = self.exercise_prefix.setdefault(exercise, array("q", [0]))
+        self.exercise_times.setdefault(exercise, array("d")).append(t)
+        self.exercise_sessions.setdefault(exercise, []).append(session)
+        prefix.append(prefix[-1] + int(session["reps"]))
+
+    def sort_time_index(self):
+        """Re-sort the time index and recompute running totals after out-of-order sessions"""
+        if self.time_index_sorted:
+            return
+        order = sorted(range(len(self.session_times)), key=self.session_times.__getitem__)
+        self.session_times = array("d", [self.session_times[i] for i in order])
+        self.sessions_by_time = [self.sessions_by_time[i] for i in order]
+        self.exercise_times = {}
+        self.exercise_sessions = {}
+        self.exercise_prefix = {}
+        for t, session in zip(self.session_times, self.sessions_by_time):
+            self.index_exercise_time(t, session)
+        self.time_index_sorted = True
+
+    def rebuild_day_index(self):
+        """Rebuild the per-day and time indexes from all sessions in memory"""
+        self.day_totals = {}
+        self.day_sessions = {}
+        self.session_times = array("d")
+        self.sessions_by_time = []
+        self.exercise_times = {}
+        self.exercise_sessions = {}
+        self.exercise_prefix = {}
+        self.time_index_sorted = True
+        for session in self.sessions():
+            self.index_session(session)
+
+    def sessions(self) -> List[Dict]:
+        """All sessions: ones logged through this server before the shared log, the log, then unwritten ones"""
+        return self.exercise_data["history"] + self.log_entries + list(self.unsynced.values())
+
+    def total_reps(self) -> Dict[str, int]:
+        totals = dict(self.exercise_data["total_reps"])
+        for exercise, reps in self.log_totals.items():
+            totals[exercise] = totals.get(exercise, 0) + reps
+        for session in self.unsynced.values():
+            totals[session["exercise"]] = totals.get(session["exercise"], 0) + session["reps"]
+        return totals
 
     def setup_handlers(self):
         """Register MCP handlers"""
@@ -68,6 +541,7 @@ class ExerciseTrackerMCP:
         @self.server.list_tools()
         async def list_tools() -> list[Tool]:
             """List available exercise tracking tools"""
+            exercise_ids = self.catalog.ids()
             return [
                 Tool(
                     name="log_exercise_session",
@@ -77,7 +551,7 @@ class ExerciseTrackerMCP:
                         "properties": {
                             "exercise_type": {
                                 "type": "string",
-                                "enum": ["squats", "pushups", "jumping_jacks"],
+                                "enum": exercise_ids,
                                 "description": "Type of exercise performed"
                             },
                             "reps_completed": {
@@ -103,6 +577,14 @@ class ExerciseTrackerMCP:
                                 "enum": ["day", "week", "month", "all"],
                                 "description": "Timeframe for statistics",
                                 "default": "week"
+                            },
+                            "from": {
+                                "type": "string",
+                                "description": "Start of a custom range (ISO date or datetime, local time); overrides timeframe"
+                            },
+                            "to": {
+                                "type": "string",
+                                "description": "End of a custom range (ISO date or datetime, inclusive)"
                             }
                         }
                     }
@@ -129,7 +611,7 @@ class ExerciseTrackerMCP:
                         "properties": {
                             "exercise": {
                                 "type": "string",
-                                "enum": ["squats", "pushups", "jumping_jacks"],
+                                "enum": exercise_ids,
                                 "description": "Exercise type to update goal for"
                             },
                             "daily_target": {
@@ -162,6 +644,7 @@ class ExerciseTrackerMCP:
         @self.server.call_tool()
         async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             """Handle tool calls"""
+            await self.sync_log_async()
             try:
                 if name == "log_exercise_session":
                     return await self.log_exercise_session(
@@ -171,7 +654,9 @@ class ExerciseTrackerMCP:
                     )
                 elif name == "get_exercise_stats":
                     return await self.get_exercise_stats(
-                        arguments.get("timeframe", "week")
+                        arguments.get("timeframe", "week"),
+                        arguments.get("from"),
+                        arguments.get("to")
                     )
                 elif name == "suggest_exercise":
                     return await self.suggest_exercise(
@@ -218,19 +703,144 @@ class ExerciseTrackerMCP:
                 )
             ]
 
+        @self.server.list_resource_templates()
+        async def list_resource_templates() -> list[ResourceTemplate]:
+            """List parameterized resources"""
+            return [
+                ResourceTemplate(
+                    uriTemplate="exercise://sessions{?from,to,exercise,cursor,limit}",
+                    name="Exercise Sessions",
+                    description=(
+                        "Sessions oldest first, optionally within from/to (ISO date or datetime) "
+                        f"and for one exercise. Up to `limit` per page (default {PAGE_SIZE}, "
+                        f"max {MAX_PAGE_SIZE}); pass `next_cursor` as `cursor` for the next page."
+                    ),
+                    mimeType="application/json"
+                ),
+                ResourceTemplate(
+                    uriTemplate="exercise://stats/daily{?from,to,exercise}",
+                    name="Daily Exercise Totals",
+                    description="Reps per exercise and session count for each day (YYYY-MM-DD) in from/to",
+                    mimeType="application/json"
+                )
+            ]
+
         @self.server.read_resource()
-        async def read_resource(uri: str) -> str:
+        async def read_resource(uri) -> str:
             """Read a resource by URI"""
+            await self.sync_log_async()
+            uri = str(uri)  # Delivered as a pydantic AnyUrl
+            parts = urlsplit(uri)
+            resource = parts.netloc + parts.path
+            params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
             if uri == "exercise://stats/summary":
-                return json.dumps(self.exercise_data["total_reps"], indent=2)
+                return json.dumps(self.total_reps(), indent=2)
             elif uri == "exercise://history/recent":
-                recent = self.exercise_data["history"][-20:]
-                return json.dumps(recent, indent=2)
+                self.sort_time_index()
+                return json.dumps(self.sessions_by_time[-20:], indent=2)
             elif uri == "exercise://goals/current":
                 return json.dumps(self.exercise_data["goals"], indent=2)
+            elif parts.scheme == "exercise" and resource == "sessions":
+                return json.dumps(self.read_sessions(params), indent=2)
+            elif parts.scheme == "exercise" and resource == "stats/daily":
+                return json.dumps(self.read_daily(params), indent=2)
             else:
                 raise ValueError(f"Unknown resource: {uri}")
 
+        @self.server.subscribe_resource()
+        async def subscribe_resource(uri):
+            """Notify the client when a resource changes"""
+            self.subscriptions.add(str(uri))
+            self.subscriber = self.server.request_context.session
+            if self.watch_task is None or self.watch_task.done():
+                self.watch_task = asyncio.create_task(self.watch_subscriptions())
+
+        @self.server.unsubscribe_resource()
+        async def unsubscribe_resource(uri):
+            self.subscriptions.discard(str(uri))
+
+    # Resources
+    def read_sessions(self, params: Dict[str, str]) -> Dict:
+        """One page of exercise://sessions, found by binary search on the time index"""
+        self.sort_time_index()
+        exercise = params.get("exercise")
+        if exercise:
+            times = self.exercise_times.get(exercise, array("d"))
+            sessions = self.exercise_sessions.get(exercise, [])
+        else:
+            times, sessions = self.session_times, self.sessions_by_time
+
+        lo = self.parse_bound(params["from"], is_end=False) if params.get("from") else float("-inf")
+        hi = self.parse_bound(params["to"], is_end=True) if params.get("to") else float("inf")
+        first = bisect_left(times, lo)
+        last = bisect_left(times, hi)
+        try:
+            limit = min(max(int(params.get("limit", PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValueError(f"Invalid limit: {params['limit']!r}")
+
+        # Cursor: time of the last session returned and how many sessions at
+        # exactly that time were returned, so it survives appends
+        start = first
+        if params.get("cursor"):
+            try:
+                t, seen = params["cursor"].split(":")
+                start = max(first, bisect_left(times, float(t)) + int(seen))
+            except ValueError:
+                raise ValueError(f"Invalid cursor: {params['cursor']!r}")
+        end = min(start + limit, last)
+
+        next_cursor = None
+        if end < last:
+            t = times[end - 1]
+            next_cursor = f"{t!r}:{end - bisect_left(times, t)}"
+        return {
+            "total": max(0, last - first),
+            "sessions": sessions[start:end],
+            "next_cursor": next_cursor
+        }
+
+    def read_daily(self, params: Dict[str, str]) -> Dict:
+        """exercise://stats/daily from the per-day index"""
+        start, end = params.get("from", "")[:10], params.get("to", "")[:10]
+        exercise = params.get("exercise")
+        days = {}
+        for day in sorted(self.day_totals):
+            if (start and day < start) or (end and day > end):
+                continue
+            totals = self.day_totals[day]
+            sessions = self.day_sessions.get(day, {})
+            if exercise:
+                if exercise not in totals:
+                    continue
+                totals = {exercise: totals[exercise]}
+                sessions = {exercise: sessions.get(exercise, 0)}
+            days[day] = {"reps": totals, "sessions": sum(sessions.values())}
+        return {"days": days}
+
+    async def watch_subscriptions(self):
+        """Send resources/updated for subscribed URIs when sessions or goals change"""
+        seen = (self.sessions_version, self.goals_version)
+        while self.subscriptions:
+            await asyncio.sleep(SUBSCRIPTION_POLL)
+            await self.sync_log_async()  # Picks up sets logged by the hook and the app
+            current = (self.sessions_version, self.goals_version)
+            if current == seen:
+                continue
+            for uri in list(self.subscriptions):
+                if uri.startswith("exercise://goals/"):
+                    changed = current[1] != seen[1]
+                else:
+                    changed = current[0] != seen[0]
+                if changed:
+                    try:
+                        await self.subscriber.send_resource_updated(uri)
+                    except Exception as e:
+                        print(f"Error sending resource update: {e}", file=sys.stderr)
+                        return
+            seen = current
+
     # Tool implementations
     async def log_exercise_session(
         self,
@@ -246,68 +856,90 @@ class ExerciseTrackerMCP:
             "duration": duration_seconds
         }
 
-        self.exercise_data["history"].append(session)
-        self.exercise_data["total_reps"][exercise_type] += reps_completed
-        self.save_data()
+        # Into the shared log, so the usage report and menubar see it too.
+        # Written behind the reply; counted now and matched when read back.
+        self.queue_write(self.pending_log, dict(session, mode="mcp"))
+        self.unsynced[(session["timestamp"], session["exercise"])] = session
+        self.index_session(session)
 
-        message = f"✅ Logged {reps_completed} {exercise_type}! Total: {self.exercise_data['total_reps'][exercise_type]}"
+        message = f"✅ Logged {reps_completed} {exercise_type}! Total: {self.total_reps().get(exercise_type, 0)}"
 
         return [TextContent(type="text", text=message)]
 
-    async def get_exercise_stats(self, timeframe: str = "week") -> list[TextContent]:
-        """Get exercise statistics for a timeframe"""
+    async def get_exercise_stats(self, timeframe: str = "week", start: Optional[str] = None,
+                                 end: Optional[str] = None) -> list[TextContent]:
+        """Get exercise statistics for a timeframe or a from/to range"""
         now = datetime.now()
 
-        # Calculate time boundary
-        if timeframe == "day":
-            boundary = now - timedelta(days=1)
-        elif timeframe == "week":
-            boundary = now - timedelta(weeks=1)
-        elif timeframe == "month":
-            boundary = now - timedelta(days=30)
-        else:  # all
-            boundary = datetime.min
-
-        # Filter sessions by timeframe
-        filtered_sessions = [
-            s for s in self.exercise_data["history"]
-            if datetime.fromisoformat(s["timestamp"]) >= boundary
-        ]
-
-        # Calculate stats
-        reps_by_exercise = {
-            "squats": 0,
-            "pushups": 0,
-            "jumping_jacks": 0
-        }
+        # Calculate time boundaries (epoch seconds, end exclusive)
+        if start or end:
+            lo = self.parse_bound(start, is_end=False) if start else float("-inf")
+            hi = self.parse_bound(end, is_end=True) if end else float("inf")
+        else:
+            if timeframe == "day":
+                lo = (now - timedelta(days=1)).timestamp()
+            elif timeframe == "week":
+                lo = (now - timedelta(weeks=1)).timestamp()
+            elif timeframe == "month":
+                lo = (now - timedelta(days=30)).timestamp()
+            else:  # all
+                lo = float("-inf")
+            hi = float("inf")
 
-        for session in filtered_sessions:
-            exercise = session["exercise"]
-            if exercise in reps_by_exercise:
-                reps_by_exercise[exercise] += session["reps"]
+        # Binary search the sorted times; per-exercise reps are a difference
+        # of running totals
+        self.sort_time_index()
+        first = bisect_left(self.session_times, lo)
+        last = bisect_left(self.session_times, hi)
+
+        reps_by_exercise = dict.fromkeys(self.catalog.ids(), 0)
+        for exercise, times in self.exercise_times.items():
+            prefix = self.exercise_prefix[exercise]
+            reps = prefix[bisect_left(times, hi)] - prefix[bisect_left(times, lo)]
+            if reps or exercise in reps_by_exercise:
+                reps_by_exercise[exercise] = reps
 
         stats = {
-            "timeframe": timeframe,
-            "total_sessions": len(filtered_sessions),
+            "timeframe": "custom" if start or end else timeframe,
+            "total_sessions": max(0, last - first),
             "reps_by_exercise": reps_by_exercise,
-            "recent_sessions": filtered_sessions[-5:] if filtered_sessions else []
+            "recent_sessions": self.sessions_by_time[max(first, last - 5):last]
         }
+        if start or end:
+            stats["from"] = start
+            stats["to"] = end
 
         return [TextContent(type="text", text=json.dumps(stats, indent=2))]
 
+    @staticmethod
+    def parse_bound(value: str, is_end: bool) -> float:
+        """Epoch seconds for a from/to argument; a date-only `to` covers the whole day"""
+        try:
+            ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except (AttributeError, ValueError):
+            raise ValueError(f"Invalid date: {value!r} (expected ISO date or datetime)")
+        if is_end:
+            if len(value) == 10:  # YYYY-MM-DD
+                ts += timedelta(days=1)
+            else:
+                return ts.timestamp() + 1e-6  # Inclusive
+        return ts.timestamp()
+
     async def suggest_exercise(self, context: str = "break") -> list[TextContent]:
         """Suggest an exercise based on context and history"""
         # Analyze recent history to suggest variety
-        recent = self.exercise_data["history"][-5:] if self.exercise_data["history"] else []
-        recent_exercises = [s["exercise"] for s in recent]
+        self.sort_time_index()
+        recent_exercises = [s["exercise"] for s in self.sessions_by_time[-5:]]
 
-        # Suggest the least recent exercise for variety
-        exercises = ["squats", "pushups", "jumping_jacks"]
+        # Suggest the least recent exercise for variety; ties go to the
+        # original three, then catalog order
+        exercises = self.catalog.ids()
+        exercises.sort(key=lambda x: FALLBACK_EXERCISES.index(x) if x in FALLBACK_EXERCISES else len(FALLBACK_EXERCISES))
         suggestion = min(exercises, key=lambda x: recent_exercises.count(x))
 
-        # Adjust reps based on performance
-        avg_reps = self.calculate_average_reps(suggestion)
-        recommended_reps = self.adjust_difficulty(avg_reps)
+        # Adjust reps based on recent performance
+        avg_reps = self.calculate_average_reps(suggestion, RECENT_WINDOW)
+        recommended_reps = self.adjust_difficulty(avg_reps, self.catalog.normal_reps(suggestion))
 
         result = {
             "exercise": suggestion,
@@ -319,8 +951,8 @@ class ExerciseTrackerMCP:
 
     async def update_goals(self, exercise: str, daily_target: int) -> list[TextContent]:
         """Update daily exercise goals"""
-        self.exercise_data["goals"][f"daily_{exercise}"] = daily_target
-        self.save_data()
+        self.record({"op": "goal", "key": f"daily_{exercise}", "value": daily_target})
+        self.goals_version += 1
 
         message = f"Updated {exercise} goal to {daily_target} reps/day"
         return [TextContent(type="text", text=message)]
@@ -328,19 +960,14 @@ class ExerciseTrackerMCP:
     async def check_streak(self) -> list[TextContent]:
         """Check current exercise streak"""
         today = datetime.now().date().isoformat()
-
-        # Check if exercised today
-        today_sessions = [
-            s for s in self.exercise_data["history"]
-            if s["timestamp"].startswith(today)
-        ]
+        sessions_today = sum(self.day_sessions.get(today, {}).values())
 
         current_streak = self.calculate_streak()
         motivation = self.get_motivation_message(current_streak)
 
         streak_info = {
-            "exercised_today": len(today_sessions) > 0,
-            "sessions_today": len(today_sessions),
+            "exercised_today": sessions_today > 0,
+            "sessions_today": sessions_today,
             "current_streak_days": current_streak,
             "motivation": motivation
         }
@@ -351,23 +978,7 @@ class ExerciseTrackerMCP:
         """Get today's exercise progress toward goals"""
         today = datetime.now().date().isoformat()
 
-        # Get today's sessions
-        today_sessions = [
-            s for s in self.exercise_data["history"]
-            if s["timestamp"].startswith(today)
-        ]
-
-        # Calculate progress
-        progress = {
-            "squats": 0,
-            "pushups": 0,
-            "jumping_jacks": 0
-        }
-
-        for session in today_sessions:
-            exercise = session["exercise"]
-            if exercise in progress:
-                progress[exercise] += session["reps"]
+        progress = self.day_totals.get(today, {})
 
         # Compare to goals
         result = {
@@ -375,9 +986,12 @@ class ExerciseTrackerMCP:
             "progress": {}
         }
 
-        for exercise in ["squats", "pushups", "jumping_jacks"]:
-            goal = self.exercise_data["goals"].get(f"daily_{exercise}", 0)
-            completed = progress[exercise]
+        goals = self.exercise_data["goals"]
+        for exercise in self.catalog.ids():
+            goal = goals.get(f"daily_{exercise}", 0)
+            completed = progress.get(exercise, 0)
+            if not goal and not completed:
+                continue
             percentage = (completed / goal * 100) if goal > 0 else 0
 
             result["progress"][exercise] = {
@@ -390,41 +1004,34 @@ class ExerciseTrackerMCP:
         return [TextContent(type="text", text=json.dumps(result, indent=2))]
 
     # Helper methods
-    def calculate_average_reps(self, exercise: str) -> int:
-        """Calculate average reps for an exercise"""
-        sessions = [
-            s["reps"] for s in self.exercise_data["history"]
-            if s["exercise"] == exercise
-        ]
-        return int(sum(sessions) / len(sessions)) if sessions else 10
-
-    def adjust_difficulty(self, current_avg: int) -> int:
-        """Progressively increase difficulty"""
-        if current_avg < 10:
-            return 10
-        elif current_avg < 20:
+    def calculate_average_reps(self, exercise: str, window: Optional[int] = None) -> int:
+        """Average reps for an exercise, over its last `window` sessions if given"""
+        self.sort_time_index()
+        prefix = self.exercise_prefix.get(exercise)
+        if not prefix or len(prefix) == 1:
+            return self.catalog.normal_reps(exercise)
+        count = len(prefix) - 1
+        if window:
+            count = min(count, window)
+        return int((prefix[-1] - prefix[-1 - count]) / count)
+
+    def adjust_difficulty(self, current_avg: int, base: int = 10) -> int:
+        """Progressively increase difficulty from the exercise's standard set size"""
+        if current_avg < base:
+            return base
+        elif current_avg < base * 2:
             return current_avg + 2
         else:
-            return min(current_avg + 1, 50)  # Cap at 50
+            return min(current_avg + 1, base * 5)  # Cap at 5 sets' worth
 
     def calculate_streak(self) -> int:
-        """Calculate current day streak"""
-        if not self.exercise_data["history"]:
-            return 0
-
+        """Calculate current day streak (consecutive days up to today)"""
         streak = 0
-        current_date = datetime.now().date()
+        check_date = datetime.now().date()
 
-        for i in range(365):  # Check last year max
-            check_date = (current_date - timedelta(days=i)).isoformat()
-            day_sessions = [
-                s for s in self.exercise_data["history"]
-                if s["timestamp"].startswith(check_date)
-            ]
-            if day_sessions:
-                streak += 1
-            else:
-                break
+        while check_date.isoformat() in self.day_sessions:
+            streak += 1
+            check_date -= timedelta(days=1)
 
         return streak
 
@@ -444,13 +1051,21 @@ class ExerciseTrackerMCP:
 async def main():
     """Run the MCP server"""
     tracker = ExerciseTrackerMCP()
+    tracker.loop = asyncio.get_running_loop()
+
+    options = tracker.server.create_initialization_options()
+    # The SDK doesn't advertise resource subscriptions on its own
+    options.capabilities.resources.subscribe = True
 
-    async with stdio_server() as (read_stream, write_stream):
-        await tracker.server.run(
-            read_stream,
-            write_stream,
-            tracker.server.create_initialization_options()
-        )
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await tracker.server.run(
+                read_stream,
+                write_stream,
+                options
+            )
+    finally:
+        tracker.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
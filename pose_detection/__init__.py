@@ -0,0 +1,44 @@
+"""
+pose_detection - Rep counting over recorded pose streams, outside the browser.
+
+A Python counterpart of the detection engine in exercise_ui.html, driven by
+the same `detection` blocks in exercises/*.json. Each exercise compiles to a
+Detector that counts reps over a (frames, 33, 4) array of MediaPipe Pose
+landmarks, vectorized with numpy:
+
+    from pose_detection import load_catalog, load_frames
+
+    detectors = load_catalog()
+    reps = detectors["squats"].count(load_frames("squats.npy"))
+
+Also usable to check new exercise definitions without a camera:
+
+    python -m pose_detection validate exercises/my_exercise.json
+    python -m pose_detection count exercises/squats.json recording.npy
+
+Requires numpy.
+"""
+
+from .engine import (
+    DETECTORS,
+    Detector,
+    compile_exercise,
+    load_catalog,
+    load_exercise,
+    load_frames,
+    validate_detection,
+    validate_exercise,
+)
+from .features import as_frames
+
+__all__ = [
+    "DETECTORS",
+    "Detector",
+    "as_frames",
+    "compile_exercise",
+    "load_catalog",
+    "load_exercise",
+    "load_frames",
+    "validate_detection",
+    "validate_exercise",
+]
@@ -0,0 +1,82 @@
+"""
+Command line for pose_detection.
+
+    python -m pose_detection validate [exercise.json ...]
+    python -m pose_detection count exercise.json recording.npy [recording2.trace ...]
+
+`validate` checks the given definitions (default: all of exercises/) and
+exits non-zero if any has problems. `count` prints the reps counted in
+each recording and the frames per second processed.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from .engine import Detector, load_frames, validate_exercise
+
+EXERCISES_DIR = Path(__file__).resolve().parent.parent / "exercises"
+
+
+def validate(paths: list) -> int:
+    if not paths:
+        paths = [p for p in sorted(EXERCISES_DIR.glob("*.json")) if not p.name.startswith("_")]
+    failed = 0
+    for path in paths:
+        try:
+            with open(path) as f:
+                problems = validate_exercise(json.load(f))
+        except (OSError, ValueError) as e:
+            problems = [str(e)]
+        if problems:
+            failed += 1
+            print(f"✗ {path}")
+            for problem in problems:
+                print(f"    {problem}")
+        else:
+            print(f"✓ {path}")
+    return 1 if failed else 0
+
+
+def count(exercise: str, recordings: list) -> int:
+    try:
+        with open(exercise) as f:
+            detector = Detector(json.load(f))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    for recording in recordings:
+        try:
+            frames = load_frames(recording)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error reading {recording}: {e}", file=sys.stderr)
+            return 1
+        start = time.perf_counter()
+        reps = detector.rep_frames(frames)
+        elapsed = time.perf_counter() - start
+        rate = len(frames) / elapsed if elapsed > 0 else float("inf")
+        print(f"{recording}: {len(reps)} {detector.id} in {len(frames):,} frames ({rate:,.0f} frames/s)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m pose_detection",
+                                     description="Count reps in recorded pose streams")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("validate", help="check exercise definitions")
+    check.add_argument("exercises", nargs="*", help="exercise JSON files (default: exercises/*.json)")
+    run = commands.add_parser("count", help="count reps in recordings")
+    run.add_argument("exercise", help="exercise JSON file")
+    run.add_argument("recordings", nargs="+", help=".npy (frames, 33, 4), .trace, or JSON lines, one frame per line")
+    args = parser.parse_args()
+
+    if args.command == "validate":
+        sys.exit(validate(args.exercises))
+    sys.exit(count(args.exercise, args.recordings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+"""
+Rep counting from exercises/*.json detection configs.
+
+Each detection type from exercise_ui.html becomes a function from a whole
+pose stream to the frames on which a rep was counted. Measurements are
+computed for all frames at once; the state machines are run without a
+per-frame Python loop:
+
+- Two-state types (angle, height_relative, position_relative,
+  position_baseline, distance, tilt, width_ratio) are hysteresis: the state
+  at each frame is the last "enter" or "leave" event before it, which is a
+  forward fill over event indices.
+- height_baseline re-baselines after every rep, and quadrant_tracking
+  clears its angle history; both search ahead one rep at a time over
+  vectorized conditions.
+
+Frames where the landmarks a type needs aren't visible leave the state
+unchanged, as in the browser.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+from .features import AXES, NUM_LANDMARKS, as_frames, body_scale, joint_angle, mean_coord, visible
+
+# Frames examined per step when searching ahead; doubles until a match
+SEARCH_CHUNK = 64
+
+
+def hysteresis(enter: np.ndarray, leave: np.ndarray, valid: np.ndarray,
+               count_on_enter: bool = False) -> np.ndarray:
+    """
+    Frames where a two-state machine counts a rep.
+
+    The machine starts inactive, becomes active on a valid `enter` frame and
+    inactive again on a valid `leave` frame. A rep is counted when it leaves
+    (or enters, with `count_on_enter`).
+    """
+    n = len(valid)
+    events = np.full(n, -1, dtype=np.int8)
+    events[valid & leave] = 0
+    events[valid & enter] = 1
+    last = np.where(events >= 0, np.arange(n), -1)
+    np.maximum.accumulate(last, out=last)
+    state = np.where(last >= 0, events[np.maximum(last, 0)], 0).astype(bool)
+    previous = np.concatenate(([False], state[:-1]))
+    if count_on_enter:
+        return np.flatnonzero(state & ~previous)
+    return np.flatnonzero(previous & ~state)
+
+
+def first_true(condition, start: int, stop: int) -> int:
+    """First index in [start, stop) where condition(lo, hi) (a mask over lo..hi) is set, else -1."""
+    step = SEARCH_CHUNK
+    while start < stop:
+        hi = min(stop, start + step)
+        hits = np.flatnonzero(condition(start, hi))
+        if hits.size:
+            return start + int(hits[0])
+        start = hi
+        step *= 2
+    return -1
+
+
+def baseline_movement(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """
+    Baseline minus value per frame, with the baseline taken on the first frame.
+
+    As in the browser (`if (!detectionState.baseline)`), a falsy baseline (0
+    or NaN) is replaced by the next valid frame's value, so the baseline is
+    the first valid non-zero value and nothing moves before that frame.
+    """
+    hits = np.flatnonzero(valid & (values != 0) & ~np.isnan(values))
+    if not hits.size:
+        return np.zeros(len(values), dtype=np.float32)
+    movement = values[hits[0]] - values
+    movement[:hits[0]] = 0
+    return movement
+
+
+# Detection types
+
+def detect_angle(frames, det):
+    joint = det["landmarks"]["joint"]
+    valid = visible(frames, joint)
+    angle = joint_angle(frames, *joint)
+    if det["landmarks"].get("joint_alt"):
+        alt = det["landmarks"]["joint_alt"]
+        angle = np.where(visible(frames, alt), (angle + joint_angle(frames, *alt)) / 2, angle)
+    thresholds = det["thresholds"]
+    return hysteresis(angle < thresholds["down"], angle > thresholds["up"], valid)
+
+
+def detect_height_baseline(frames, det):
+    primary = det["landmarks"]["primary"]
+    seen = visible(frames, primary)
+    height = mean_coord(frames, primary)
+    trigger = det["thresholds"]["trigger"]
+
+    reference = det["landmarks"].get("reference")
+    if det.get("baseline") == "leg_length_ratio" and reference:
+        valid = seen & visible(frames, reference)
+        threshold = (height - mean_coord(frames, reference)) * trigger
+    else:
+        valid = seen
+        threshold = np.full(len(frames), trigger, dtype=np.float32)
+
+    reps = []
+    start = first_true(lambda lo, hi: seen[lo:hi], 0, len(frames))
+    if start < 0:
+        return np.array(reps, dtype=np.intp)
+    baseline = height[start]
+    while True:
+        # Lift past the threshold, then back down below 30% of it
+        up = first_true(
+            lambda lo, hi: valid[lo:hi] & (baseline - height[lo:hi] > threshold[lo:hi]),
+            start, len(frames))
+        if up < 0:
+            break
+        down = first_true(
+            lambda lo, hi: valid[lo:hi] & (baseline - height[lo:hi] < threshold[lo:hi] * 0.3),
+            up + 1, len(frames))
+        if down < 0:
+            break
+        reps.append(down)
+        baseline = height[down]
+        start = down + 1
+    return np.array(reps, dtype=np.intp)
+
+
+def detect_height_relative(frames, det):
+    target, reference = det["landmarks"]["target"], det["landmarks"]["reference"]
+    valid = visible(frames, target) & visible(frames, reference)
+    if det.get("mode") == "either":
+        target_y = frames[:, list(target), 1].min(axis=1)
+    else:
+        target_y = mean_coord(frames, target)
+    raised = mean_coord(frames, reference) - target_y > det["thresholds"]["trigger"]
+    return hysteresis(raised, ~raised, valid, count_on_enter=True)
+
+
+def detect_position_relative(frames, det):
+    target, reference = det["landmarks"]["target"], det["landmarks"]["reference"]
+    valid = visible(frames, target) & visible(frames, reference)
+    above = (frames[:, list(target), 1] < frames[:, list(reference), 1]).all(axis=1)
+    return hysteresis(above, ~above, valid, count_on_enter=True)
+
+
+def detect_position_baseline(frames, det):
+    target, reference = det["landmarks"]["target"][0], det["landmarks"]["reference"]
+    axis = det["axis"]
+    valid = visible(frames, [target]) & visible(frames, reference)
+    distance = mean_coord(frames, reference, axis) - frames[:, target, AXES[axis]]
+    movement = baseline_movement(distance, valid)
+    trigger = det["thresholds"]["trigger"]
+    return hysteresis(movement > trigger, movement < trigger * 0.3, valid)
+
+
+def detect_distance(frames, det):
+    pairs = det["landmarks"]["pairs"]
+    ids = [i for pair in pairs for i in (pair["from"], pair["to"])]
+    valid = visible(frames, ids)
+    a = frames[:, [pair["from"] for pair in pairs], :2]
+    b = frames[:, [pair["to"] for pair in pairs], :2]
+    distance = np.abs(a - b).sum(axis=2)
+    threshold = det["thresholds"]["trigger"] * body_scale(frames)
+    crunching = (distance < threshold[:, np.newaxis]).any(axis=1)
+    return hysteresis(crunching, ~crunching, valid)
+
+
+def detect_tilt(frames, det):
+    upper, lower = det["landmarks"]["upper"], det["landmarks"]["lower"]
+    valid = visible(frames, upper) & visible(frames, lower)
+    tilt = np.abs(mean_coord(frames, upper, "x") - mean_coord(frames, lower, "x"))
+    threshold = det["thresholds"]["trigger"] * body_scale(frames)
+    return hysteresis(tilt > threshold, tilt < threshold * 0.4, valid)
+
+
+def detect_width_ratio(frames, det):
+    upper, lower = det["landmarks"]["upper"], det["landmarks"]["lower"]
+    valid = visible(frames, upper) & visible(frames, lower)
+    upper_width = np.abs(frames[:, upper[1], 0] - frames[:, upper[0], 0])
+    lower_width = np.abs(frames[:, lower[1], 0] - frames[:, lower[0], 0])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = upper_width / lower_width
+    twist = baseline_movement(ratio, valid)
+    trigger = det["thresholds"]["trigger"]
+    return hysteresis(twist > trigger, twist < trigger * 0.3, valid)
+
+
+def detect_quadrant_tracking(frames, det):
+    wrists, shoulders = det["landmarks"]["wrist"], det["landmarks"]["shoulder"]
+    shown = np.flatnonzero(visible(frames, wrists) & visible(frames, shoulders))
+    history_length = det.get("historyLength", 30)
+    min_history = det.get("minHistoryForDetection", 20)
+    if not shown.size:
+        return shown
+
+    # Angle of the higher wrist around its shoulder, on visible frames only
+    f = frames[shown]
+    right = f[:, wrists[1], 1] <= f[:, wrists[0], 1]
+    wrist = np.where(right[:, np.newaxis], f[:, wrists[1], :2], f[:, wrists[0], :2])
+    shoulder = np.where(right[:, np.newaxis], f[:, shoulders[1], :2], f[:, shoulders[0], :2])
+    angle = np.degrees(np.arctan2(wrist[:, 1] - shoulder[:, 1], wrist[:, 0] - shoulder[:, 0]))
+
+    # For each quadrant, the latest frame (so far) the arm was in it
+    quadrants = (
+        (angle < -45) & (angle > -135),  # top
+        (angle > 45) & (angle < 135),    # bottom
+        np.abs(angle) > 135,             # left
+        np.abs(angle) < 45,              # right
+    )
+    positions = np.arange(len(angle))
+    latest = np.empty((4, len(angle)), dtype=np.intp)
+    for q, inside in enumerate(quadrants):
+        latest[q] = np.maximum.accumulate(np.where(inside, positions, -1))
+
+    # A rep: all four quadrants within the history window; the history then
+    # starts over
+    reps = []
+    start = 0
+    while True:
+        def circled(lo, hi, start=start):
+            window_start = np.maximum(start, positions[lo:hi] - history_length + 1)
+            return (latest[:, lo:hi] >= window_start).all(axis=0)
+
+        done = first_true(circled, start + min_history - 1, len(angle))
+        if done < 0:
+            break
+        reps.append(shown[done])
+        if min_history < 2:
+            # The browser re-arms on a frame with less history than the
+            # minimum; with a minimum of 1 there never is one, so it counts once
+            break
+        start = done + 1
+    return np.array(reps, dtype=np.intp)
+
+
+DETECTORS = {
+    "angle": detect_angle,
+    "height_baseline": detect_height_baseline,
+    "height_relative": detect_height_relative,
+    "position_relative": detect_position_relative,
+    "position_baseline": detect_position_baseline,
+    "distance": detect_distance,
+    "tilt": detect_tilt,
+    "width_ratio": detect_width_ratio,
+    "quadrant_tracking": detect_quadrant_tracking,
+}
+
+# Landmark lists each type reads: {key: required length, or None for any}
+REQUIRED_LANDMARKS = {
+    "angle": {"joint": 3},
+    "height_baseline": {"primary": None},
+    "height_relative": {"target": None, "reference": None},
+    "position_relative": {"target": None, "reference": None},
+    "position_baseline": {"target": None, "reference": None},
+    "distance": {},
+    "tilt": {"upper": None, "lower": None},
+    "width_ratio": {"upper": 2, "lower": 2},
+    "quadrant_tracking": {"wrist": 2, "shoulder": 2},
+}
+
+
+# Configs
+
+def _check_ids(ids, name: str, problems: list, length=None):
+    if not isinstance(ids, list) or not ids:
+        problems.append(f"detection.landmarks.{name} must be a non-empty list of landmark indices")
+        return
+    if length is not None and len(ids) != length:
+        problems.append(f"detection.landmarks.{name} must have {length} landmarks, has {len(ids)}")
+    for i in ids:
+        if not isinstance(i, int) or isinstance(i, bool) or not 0 <= i < NUM_LANDMARKS:
+            problems.append(f"detection.landmarks.{name}: {i!r} is not a landmark index (0-{NUM_LANDMARKS - 1})")
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_detection(det) -> list:
+    """Problems with a `detection` block (empty if it can be compiled)."""
+    if not isinstance(det, dict):
+        return ["detection must be an object"]
+    kind = det.get("type")
+    if kind not in DETECTORS:
+        return [f"unknown detection type {kind!r} (expected one of: {', '.join(DETECTORS)})"]
+
+    problems = []
+    landmarks = det.get("landmarks")
+    if not isinstance(landmarks, dict):
+        return ["detection.landmarks must be an object"]
+    for name, length in REQUIRED_LANDMARKS[kind].items():
+        _check_ids(landmarks.get(name), name, problems, length)
+
+    if kind == "angle" and landmarks.get("joint_alt") is not None:
+        _check_ids(landmarks["joint_alt"], "joint_alt", problems, 3)
+    if kind == "height_baseline" and det.get("baseline") == "leg_length_ratio":
+        _check_ids(landmarks.get("reference"), "reference", problems)
+    if kind == "position_relative" and not problems and len(landmarks["target"]) != len(landmarks["reference"]):
+        problems.append("detection.landmarks.target and reference must pair up (same length)")
+    if kind == "position_baseline" and det.get("axis") not in AXES:
+        problems.append("detection.axis must be one of: x, y, z")
+    if kind == "distance":
+        pairs = landmarks.get("pairs")
+        if not isinstance(pairs, list) or not pairs:
+            problems.append("detection.landmarks.pairs must be a non-empty list of {from, to}")
+        else:
+            for n, pair in enumerate(pairs):
+                if not isinstance(pair, dict):
+                    problems.append(f"detection.landmarks.pairs[{n}] must be an object with from/to")
+                    continue
+                _check_ids([pair.get("from"), pair.get("to")], f"pairs[{n}]", problems)
+
+    thresholds = det.get("thresholds", {})
+    if kind == "angle":
+        down, up = thresholds.get("down"), thresholds.get("up")
+        if not _is_number(down) or not _is_number(up):
+            problems.append("detection.thresholds.down and up must be numbers (degrees)")
+        elif down >= up:
+            problems.append(f"detection.thresholds.down ({down}) must be below up ({up})")
+    elif kind == "quadrant_tracking":
+        length = det.get("historyLength", 30)
+        minimum = det.get("minHistoryForDetection", 20)
+        if not isinstance(length, int) or not isinstance(minimum, int) or not 1 <= minimum <= length:
+            problems.append("minHistoryForDetection must be an integer from 1 to historyLength")
+    elif kind != "position_relative":
+        trigger = thresholds.get("trigger")
+        if not _is_number(trigger) or trigger <= 0:
+            problems.append("detection.thresholds.trigger must be a positive number")
+    return problems
+
+
+def validate_exercise(config) -> list:
+    """Problems with an exercise definition (empty if it is usable)."""
+    if not isinstance(config, dict):
+        return ["exercise definition must be a JSON object"]
+    problems = []
+    for key in ("id", "name"):
+        if not isinstance(config.get(key), str) or not config.get(key):
+            problems.append(f"{key} must be a non-empty string")
+    reps = config.get("reps")
+    if not isinstance(reps, dict) or not all(
+            isinstance(reps.get(mode), int) and reps.get(mode) > 0 for mode in ("normal", "quick")):
+        problems.append("reps.normal and reps.quick must be positive integers")
+    if "detection" not in config:
+        problems.append("detection is missing")
+    else:
+        problems.extend(validate_detection(config["detection"]))
+    return problems
+
+
+class Detector:
+    """A compiled exercise: counts reps in pose streams."""
+
+    def __init__(self, config: dict):
+        problems = validate_exercise(config)
+        if problems:
+            name = config.get("id") if isinstance(config, dict) else None
+            raise ValueError(f"{name or 'exercise'}: {'; '.join(problems)}")
+        self.config = config
+        self.id = config["id"]
+        self.detection = config["detection"]
+        self._detect = DETECTORS[self.detection["type"]]
+
+    def __repr__(self):
+        return f"Detector({self.id!r}, {self.detection['type']!r})"
+
+    def rep_frames(self, frames) -> np.ndarray:
+        """Indices of the frames on which a rep was counted."""
+        frames = as_frames(frames)
+        if not len(frames):
+            return np.array([], dtype=np.intp)
+        return self._detect(frames, self.detection)
+
+    def count(self, frames) -> int:
+        return len(self.rep_frames(frames))
+
+
+def compile_exercise(config: dict) -> Detector:
+    """Compile an exercise definition; raises ValueError listing any problems."""
+    return Detector(config)
+
+
+def load_exercise(path) -> Detector:
+    with open(path) as f:
+        return Detector(json.load(f))
+
+
+def load_catalog(exercises_dir=None) -> dict:
+    """Detectors for every exercises/*.json (files starting with _ are skipped)."""
+    exercises_dir = Path(exercises_dir or Path(__file__).resolve().parent.parent / "exercises")
+    detectors = {}
+    for path in sorted(exercises_dir.glob("*.json")):
+        if path.name.startswith("_"):
+            continue
+        detector = load_exercise(path)
+        detectors[detector.id] = detector
+    return detectors
+
+
+def load_frames(path) -> np.ndarray:
+    """
+    A recorded pose stream: a .npy array of shape (frames, 33, 4), a .trace
+    recorded by the tracker (see exercise_trace.py), or JSON lines with one
+    frame per line (a list of {x, y, z, visibility} landmarks, or an object
+    with a "landmarks" list).
+    """
+    path = Path(path)
+    if path.suffix == ".npy":
+        return as_frames(np.load(path, mmap_mode="r"))
+    if path.suffix == ".trace":
+        from exercise_trace import load_trace
+        return as_frames(load_trace(path)[2])
+    frames = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            frame = json.loads(line)
+            if isinstance(frame, dict):
+                frame = frame["landmarks"]
+            frames.append([
+                [p.get("x", 0), p.get("y", 0), p.get("z", 0), p.get("visibility", 1)]
+                if isinstance(p, dict) else p
+                for p in frame
+            ])
+    return as_frames(np.array(frames, dtype=np.float32).reshape(-1, NUM_LANDMARKS, 4))
@@ -0,0 +1,61 @@
+"""
+Per-frame landmark measurements, vectorized over a whole pose stream.
+
+Frames are a float array of shape (frames, 33, 4): MediaPipe Pose
+landmarks with x, y (normalized image coordinates, y grows downwards), z
+and visibility. Streams without a visibility column count as fully visible.
+"""
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+# Landmarks below this visibility are treated as missing (as in exercise_ui.html)
+MIN_VISIBILITY = 0.5
+
+AXES = {"x": 0, "y": 1, "z": 2}
+
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_HIP, RIGHT_HIP = 23, 24
+
+
+def as_frames(frames) -> np.ndarray:
+    """Validate and normalize a pose stream to (frames, 33, 4) float32."""
+    frames = np.asarray(frames, dtype=np.float32)
+    if frames.ndim == 2:
+        frames = frames[np.newaxis]
+    if frames.ndim != 3 or frames.shape[1] != NUM_LANDMARKS or frames.shape[2] < 2:
+        raise ValueError(f"expected frames of shape (n, {NUM_LANDMARKS}, 4), got {frames.shape}")
+    if frames.shape[2] < 4:
+        padded = np.ones(frames.shape[:2] + (4,), dtype=np.float32)
+        padded[:, :, :frames.shape[2]] = frames
+        padded[:, :, frames.shape[2]:3] = 0
+        frames = padded
+    return frames
+
+
+def visible(frames: np.ndarray, ids) -> np.ndarray:
+    """Frames where every landmark in `ids` is visible enough."""
+    return (frames[:, list(ids), 3] > MIN_VISIBILITY).all(axis=1)
+
+
+def mean_coord(frames: np.ndarray, ids, axis: str = "y") -> np.ndarray:
+    return frames[:, list(ids), AXES[axis]].mean(axis=1)
+
+
+def joint_angle(frames: np.ndarray, a: int, b: int, c: int) -> np.ndarray:
+    """Angle at landmark b between b->a and b->c, in degrees (0-180)."""
+    pa, pb, pc = frames[:, a, :2], frames[:, b, :2], frames[:, c, :2]
+    radians = (np.arctan2(pc[:, 1] - pb[:, 1], pc[:, 0] - pb[:, 0]) -
+               np.arctan2(pa[:, 1] - pb[:, 1], pa[:, 0] - pb[:, 0]))
+    angle = np.abs(np.degrees(radians))
+    return np.where(angle > 180, 360 - angle, angle)
+
+
+def body_scale(frames: np.ndarray) -> np.ndarray:
+    """Larger of shoulder width and torso height (at least 0.1), for scaling thresholds."""
+    shoulder_width = np.abs(frames[:, LEFT_SHOULDER, 0] - frames[:, RIGHT_SHOULDER, 0])
+    torso_height = np.abs(
+        (frames[:, LEFT_SHOULDER, 1] + frames[:, RIGHT_SHOULDER, 1]) / 2 -
+        (frames[:, LEFT_HIP, 1] + frames[:, RIGHT_HIP, 1]) / 2
+    )
+    return np.maximum(np.maximum(shoulder_width, torso_height), 0.1)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Benchmark the stdio MCP server's tools against synthetic histories.
+
+For each size, writes that many sessions to a throwaway ~/.vibereps log
+(closed months rotated into segments, like a real install), then starts a
+fresh process that builds ExerciseTrackerMCP and calls each tool handler
+directly in a loop. Reports startup time, peak RSS and per-tool latency.
+
+Usage:
+    python scripts/bench_mcp_server.py
+    python scripts/bench_mcp_server.py --sizes 1000,100000 --iterations 200
+    python scripts/bench_mcp_server.py --json > bench.json
+
+Needs the server's dependencies (`pip install mcp`).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+EXERCISES = ["squats", "pushups", "jumping_jacks", "calf_raises", "arm_circles", "high_knees"]
+
+# (label, tool method, arguments)
+TOOLS = [
+    ("check_streak", "check_streak", ()),
+    ("get_progress_today", "get_progress_today", ()),
+    ("get_exercise_stats(week)", "get_exercise_stats", ("week",)),
+    ("get_exercise_stats(all)", "get_exercise_stats", ("all",)),
+    ("suggest_exercise", "suggest_exercise", ()),
+    ("log_exercise_session", "log_exercise_session", ("squats", 10, 30)),
+]
+
+
+def write_history(home: Path, sessions: int, days: int):
+    """Write `sessions` entries spread evenly over the last `days` days, oldest first."""
+    from exercise_log import rotate_if_needed
+
+    log_file = home / ".vibereps" / "exercises.jsonl"
+    log_file.parent.mkdir(parents=True)
+    rng = random.Random(sessions)
+    now = datetime.now()
+    start = now - timedelta(days=days)
+    step = (now - start) / sessions
+    with open(log_file, "w") as f:
+        for i in range(sessions):
+            f.write(json.dumps({
+                "timestamp": (start + step * i).isoformat(),
+                "exercise": rng.choice(EXERCISES),
+                "reps": rng.randint(5, 25),
+                "duration": rng.randint(10, 60),
+                "mode": "normal"
+            }) + "\n")
+    rotate_if_needed(log_file)
+
+
+def peak_rss_mb() -> float:
+    # Linux: this process only (ru_maxrss can carry over the parent's peak
+    # across fork/exec)
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def measure(iterations: int) -> dict:
+    """Run inside the child process, with HOME pointing at the synthetic data."""
+    from mcp_exercise_server import ExerciseTrackerMCP
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    tracker = ExerciseTrackerMCP()
+    startup = time.perf_counter() - start
+
+    async def run():
+        results = {}
+        for label, method, args in TOOLS:
+            handler = getattr(tracker, method)
+            timings = []
+            for _ in range(iterations):
+                t0 = time.perf_counter()
+                await tracker.sync_log_async()  # call_tool does this before every tool
+                await handler(*args)
+                timings.append((time.perf_counter() - t0) * 1000)
+            results[label] = {
+                "p50_ms": percentile(timings, 0.5),
+                "p95_ms": percentile(timings, 0.95),
+                "max_ms": max(timings)
+            }
+        return results
+
+    tools = asyncio.run(run())
+    tracker.close()
+    return {
+        "startup_s": startup,
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline,
+        "tools": tools
+    }
+
+
+def bench(sessions: int, days: int, iterations: int) -> dict:
+    home = Path(tempfile.mkdtemp(prefix="vibereps-bench-"))
+    try:
+        start = time.perf_counter()
+        write_history(home, sessions, days)
+        setup = time.perf_counter() - start
+
+        env = dict(os.environ, HOME=str(home))
+        env.pop("USERPROFILE", None)
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", "--iterations", str(iterations)],
+            env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"benchmark for {sessions} sessions failed:\n{proc.stderr}")
+        result = json.loads(proc.stdout.splitlines()[-1])
+        result.update(sessions=sessions, setup_s=setup)
+        return result
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+
+def print_result(result: dict):
+    print(f"\n{result['sessions']:,} sessions")
+    print(f"  startup {result['startup_s']:.2f}s   peak RSS {result['peak_rss_mb']:.0f} MB "
+          f"(imports {result['baseline_rss_mb']:.0f} MB)   data setup {result['setup_s']:.1f}s")
+    print(f"  {'tool':<28} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for label, t in result["tools"].items():
+        print(f"  {label:<28} {t['p50_ms']:>9.3f} {t['p95_ms']:>9.3f} {t['max_ms']:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mcp_exercise_server tools")
+    parser.add_argument("--sizes", default="1000,100000,1000000",
+                        help="comma-separated history sizes (default: 1000,100000,1000000)")
+    parser.add_argument("--days", type=int, default=365,
+                        help="days the history is spread over (default: 365)")
+    parser.add_argument("--iterations", type=int, default=100,
+                        help="calls per tool (default: 100)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.iterations)))
+        return
+
+    results = []
+    for size in (int(s.replace("_", "")) for s in args.sizes.split(",") if s):
+        result = bench(size, args.days, args.iterations)
+        results.append(result)
+        if not args.json:
+            print_result(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,8 @@ mkdir -p "$BUILD_DIR"
 # Files to include in release
 FILES=(
     "exercise_tracker.py"
+    "exercise_log.py"
+    "exercise_trace.py"
     "notify_complete.py"
     "exercise_ui.html"
     "install.sh"
@@ -0,0 +1,99 @@
+"""
+Response cache for read endpoints.
+
+Menubar apps poll /api/stats, /api/summary/{date} and /api/leaderboard far
+more often than the data changes. Responses are cached per user and endpoint
+and carry ETag/Last-Modified headers so conditional requests get a 304.
+
+Entries are validated against a version token read from the database (the
+user's `data_version`, or the newest exercise for the leaderboard), so a write
+handled by any worker invalidates them without cross-process messaging.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Hashable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+class ResponseCache:
+    """LRU cache of JSON bodies keyed by (endpoint, user, ...) and a version token."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (version, body)
+        self._lock = threading.Lock()
+
+    def respond(
+        self,
+        request: Request,
+        key: Hashable,
+        version: Hashable,
+        last_modified: datetime,
+        compute: Callable[[], object]
+    ) -> Response:
+        """
+        Serve `key` at `version`, answering 304 if the client already has it.
+
+        `last_modified` is a naive UTC datetime. `compute` is only called on a
+        cache miss and must return something JSON-encodable.
+        """
+        etag = '"' + hashlib.sha1(repr((key, version)).encode()).hexdigest()[:20] + '"'
+        last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": format_datetime(last_modified, usegmt=True),
+            "Cache-Control": "private, no-cache"
+        }
+
+        if self._not_modified(request, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(key)
+                body = entry[1]
+            else:
+                body = None
+
+        if body is None:
+            body = json.dumps(jsonable_encoder(compute())).encode()
+            with self._lock:
+                self._entries[key] = (version, body)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    @staticmethod
+    def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+            tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            since = _parse_http_date(if_modified_since)
+            return since is not None and last_modified <= since
+
+        return False
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
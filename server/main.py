@@ -8,24 +8,37 @@ Provides:
 
 import os
 import json
+import math
+import asyncio
 import secrets
 from datetime import datetime, timedelta
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager, nullcontext
 from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from fastapi import FastAPI, HTTPException, Header, Depends, Request
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, literal, select, union_all
 
-from models import init_db, User, Exercise, DailySummaryRecord
+from cache import ResponseCache
+from models import init_db, upsert_increment, User, Exercise, ExerciseRollup, DailySummaryRecord
+from ratelimit import InFlightLimiter, RateLimiter
+from retention import RETENTION_DAYS, RETENTION_INTERVAL_HOURS, compact_exercises
 
 
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./vibereps.db")
 SessionLocal = init_db(DATABASE_URL)
 
+# Cached read responses, validated against User.data_version
+response_cache = ResponseCache()
+
+# Backpressure for write routes
+rate_limiter = RateLimiter()
+inflight_writes = InFlightLimiter()
+
 
 def get_db():
     db = SessionLocal()
@@ -46,6 +59,25 @@ def require_user(x_api_key: str = Header(...), db: Session = Depends(get_db)) ->
     return user
 
 
+def limit_writes(request: Request):
+    """Per-key token bucket plus global in-flight cap, checked before touching the DB."""
+    client = request.headers.get("x-api-key") or (request.client.host if request.client else "anonymous")
+    retry_after = rate_limiter.take(request.url.path, client)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+    if not inflight_writes.acquire():
+        raise HTTPException(status_code=503, detail="Server busy", headers={"Retry-After": "1"})
+    try:
+        yield
+    finally:
+        inflight_writes.release()
+
+
 # Pydantic models
 class ExerciseLog(BaseModel):
     exercise: str
@@ -53,8 +85,26 @@ class ExerciseLog(BaseModel):
     duration: int = 0
 
 
+def validate_timezone(value: Optional[str]) -> Optional[str]:
+    if value is not None:
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown time zone: {value}")
+    return value
+
+
 class UserCreate(BaseModel):
     username: str
+    timezone: str = "UTC"  # IANA name, e.g. America/New_York
+
+    _check_timezone = field_validator("timezone")(validate_timezone)
+
+
+class UserUpdate(BaseModel):
+    timezone: Optional[str] = None
+
+    _check_timezone = field_validator("timezone")(validate_timezone)
 
 
 class UserResponse(BaseModel):
@@ -82,11 +132,33 @@ class DailySummary(BaseModel):
 
 
 # FastAPI app
+async def run_retention_periodically():
+    """Fold raw rows past the retention window into rollups, forever."""
+    while True:
+        def run_once():
+            db = SessionLocal()
+            try:
+                return compact_exercises(db)
+            finally:
+                db.close()
+
+        try:
+            await asyncio.to_thread(run_once)
+        except Exception as e:
+            print(f"Retention job failed: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL_HOURS * 3600)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    retention_task = None
+    if RETENTION_DAYS > 0:
+        retention_task = asyncio.create_task(run_retention_periodically())
     yield
     # Shutdown
+    if retention_task:
+        retention_task.cancel()
 
 
 app = FastAPI(
@@ -98,7 +170,7 @@ app = FastAPI(
 
 # ============== REST API (for hook) ==============
 
-@app.post("/api/users", response_model=UserResponse)
+@app.post("/api/users", response_model=UserResponse, dependencies=[Depends(limit_writes)])
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
     """Create a new user and return API key."""
     existing = db.query(User).filter(User.username == user.username).first()
@@ -106,7 +178,7 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Username already exists")
 
     api_key = secrets.token_hex(32)
-    db_user = User(username=user.username, api_key=api_key)
+    db_user = User(username=user.username, api_key=api_key, timezone=user.timezone)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
@@ -114,107 +186,111 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     return UserResponse(id=db_user.id, username=db_user.username, api_key=api_key)
 
 
-@app.post("/api/log")
+@app.patch("/api/users/me", dependencies=[Depends(limit_writes)])
+def update_user(
+    update: UserUpdate,
+    user: User = Depends(require_user),
+    db: Session = Depends(get_db)
+):
+    """Update user settings. Only affects days of exercises logged afterwards."""
+    if update.timezone is not None:
+        user.timezone = update.timezone
+        touch_user_data(user, db)  # Day buckets for "today" changed
+    db.commit()
+
+    return {"status": "updated", "username": user.username, "timezone": user.timezone}
+
+
+@app.post("/api/log", dependencies=[Depends(limit_writes)])
 def log_exercise(
     exercise: ExerciseLog,
     user: User = Depends(require_user),
     db: Session = Depends(get_db)
 ):
     """Log an exercise session (called by local hook)."""
+    now = datetime.utcnow()
     db_exercise = Exercise(
         user_id=user.id,
         exercise_type=exercise.exercise,
         reps=exercise.reps,
-        duration=exercise.duration
+        duration=exercise.duration,
+        created_at=now,
+        local_date=user.local_date(now)
     )
     db.add(db_exercise)
+    touch_user_data(user, db, now)
     db.commit()
 
     return {"status": "logged", "reps": exercise.reps, "exercise": exercise.exercise}
 
 
 @app.get("/api/stats", response_model=StatsResponse)
-def get_stats(user: User = Depends(require_user), db: Session = Depends(get_db)):
+def get_stats(request: Request, user: User = Depends(require_user), db: Session = Depends(get_db)):
     """Get user stats."""
-    return calculate_stats(user, db)
+    # "Today" and the streak also change at local midnight
+    return response_cache.respond(
+        request,
+        key=("stats", user.id, user.local_date()),
+        version=user.data_version,
+        last_modified=max(user.data_updated_at or user.created_at, user.day_start()),
+        compute=lambda: calculate_stats(user, db)
+    )
 
 
 @app.get("/api/leaderboard")
-def get_leaderboard(db: Session = Depends(get_db)):
+def get_leaderboard(request: Request, db: Session = Depends(get_db)):
     """Get top users by total reps."""
-    results = (
-        db.query(
-            User.username,
-            func.sum(Exercise.reps).label("total_reps"),
-            func.count(Exercise.id).label("sessions")
-        )
-        .join(Exercise)
-        .group_by(User.id)
-        .order_by(func.sum(Exercise.reps).desc())
-        .limit(10)
-        .all()
+    # Any user's new exercise can change the ranking
+    newest = db.query(Exercise.id, Exercise.created_at).order_by(Exercise.id.desc()).first()
+    return response_cache.respond(
+        request,
+        key=("leaderboard",),
+        version=newest.id if newest else 0,
+        last_modified=newest.created_at if newest else datetime(1970, 1, 1),
+        compute=lambda: calculate_leaderboard(db)
     )
 
-    return [
-        {"rank": i + 1, "username": r.username, "total_reps": r.total_reps, "sessions": r.sessions}
-        for i, r in enumerate(results)
-    ]
-
 
-@app.post("/api/summary")
+@app.post("/api/summary", dependencies=[Depends(limit_writes)])
 def log_daily_summary(
     summary: DailySummary,
     user: User = Depends(require_user),
     db: Session = Depends(get_db)
 ):
-    """Log daily code metrics summary. Updates if exists for that date."""
-    date = summary.date or datetime.utcnow().strftime("%Y-%m-%d")
-
-    # Check if record exists for this date
-    existing = (
-        db.query(DailySummaryRecord)
-        .filter(DailySummaryRecord.user_id == user.id)
-        .filter(DailySummaryRecord.date == date)
-        .first()
-    )
-
-    if existing:
-        # Update existing record (accumulate)
-        existing.lines_accepted += summary.lines_accepted
-        existing.pull_requests += summary.pull_requests
-        existing.commits += summary.commits
-        existing.tokens_used += summary.tokens_used
-    else:
-        # Create new record
-        existing = DailySummaryRecord(
-            user_id=user.id,
-            date=date,
-            lines_accepted=summary.lines_accepted,
-            pull_requests=summary.pull_requests,
-            commits=summary.commits,
-            tokens_used=summary.tokens_used
-        )
-        db.add(existing)
-
-    db.commit()
-
-    return {
-        "status": "logged",
-        "date": date,
-        "lines_accepted": existing.lines_accepted,
-        "pull_requests": existing.pull_requests,
-        "commits": existing.commits,
-        "tokens_used": existing.tokens_used
-    }
+    """Log daily code metrics summary. Accumulates into the record for that date."""
+    date = summary.date or user.local_date()
+    return accumulate_daily_summary(user, date, summary.model_dump(exclude={"date"}), db)
 
 
 @app.get("/api/summary/{date}")
 def get_daily_summary(
     date: str,
+    request: Request,
     user: User = Depends(require_user),
     db: Session = Depends(get_db)
 ):
     """Get combined daily summary (code + exercises) for a specific date."""
+    return response_cache.respond(
+        request,
+        key=("summary", user.id, date),
+        version=user.data_version,
+        last_modified=user.data_updated_at or user.created_at,
+        compute=lambda: calculate_daily_summary(user, date, db)
+    )
+
+
+# ============== Helper functions ==============
+
+def touch_user_data(user: User, db: Session, now: Optional[datetime] = None):
+    """Invalidate cached responses for a user, as part of the caller's transaction."""
+    db.query(User).filter(User.id == user.id).update(
+        {User.data_version: User.data_version + 1, User.data_updated_at: now or datetime.utcnow()},
+        synchronize_session=False
+    )
+
+
+def calculate_daily_summary(user: User, date: str, db: Session) -> dict:
+    """Combined code metrics and exercise totals for one YYYY-MM-DD date."""
     # Get code metrics
     code_summary = (
         db.query(DailySummaryRecord)
@@ -223,18 +299,8 @@ def get_daily_summary(
         .first()
     )
 
-    # Get exercises for that date
-    exercises = (
-        db.query(Exercise)
-        .filter(Exercise.user_id == user.id)
-        .filter(func.date(Exercise.created_at) == date)
-        .all()
-    )
-
-    # Aggregate exercises by type
-    exercise_totals = {}
-    for e in exercises:
-        exercise_totals[e.exercise_type] = exercise_totals.get(e.exercise_type, 0) + e.reps
+    # Get exercises for that date, aggregated by type
+    exercise_totals = exercise_totals_for_date(user, date, db)
 
     return {
         "date": date,
@@ -248,28 +314,121 @@ def get_daily_summary(
         "total_reps": sum(exercise_totals.values())
     }
 
+def accumulate_daily_summary(user: User, date: str, metrics: dict, db: Session) -> dict:
+    """Add code metrics to the user's summary for `date` in a single upsert."""
+    record = upsert_increment(
+        db,
+        DailySummaryRecord,
+        keys={"user_id": user.id, "date": date},
+        increments=metrics,
+        updated_at=datetime.utcnow()
+    )
+    touch_user_data(user, db)
+    db.commit()
+
+    return {
+        "status": "logged",
+        "date": date,
+        "lines_accepted": record.lines_accepted,
+        "pull_requests": record.pull_requests,
+        "commits": record.commits,
+        "tokens_used": record.tokens_used
+    }
+
+
+def exercise_tiers():
+    """
+    Union of raw exercise rows and compacted rollups as one subquery.
+
+    Columns: user_id, date, exercise_type, reps, sessions. Raw rows count as
+    one session each; rollup rows carry the number of rows they replaced.
+    """
+    raw = select(
+        Exercise.user_id.label("user_id"),
+        Exercise.local_date.label("date"),
+        Exercise.exercise_type.label("exercise_type"),
+        Exercise.reps.label("reps"),
+        literal(1).label("sessions")
+    )
+    rolled = select(
+        ExerciseRollup.user_id,
+        ExerciseRollup.date,
+        ExerciseRollup.exercise_type,
+        ExerciseRollup.reps,
+        ExerciseRollup.sessions
+    )
+    return union_all(raw, rolled).subquery()
+
+
+def exercise_totals_for_date(user: User, date: str, db: Session) -> dict:
+    """Reps per exercise type for one YYYY-MM-DD date, across raw rows and rollups."""
+    tiers = exercise_tiers()
+    results = (
+        db.query(tiers.c.exercise_type, func.sum(tiers.c.reps))
+        .filter(tiers.c.user_id == user.id)
+        .filter(tiers.c.date == date)
+        .group_by(tiers.c.exercise_type)
+        .all()
+    )
+    return {exercise_type: int(reps) for exercise_type, reps in results}
+
+
+def calculate_leaderboard(db: Session) -> list:
+    """Top 10 users by total reps, across raw rows and rollups."""
+    tiers = exercise_tiers()
+    results = (
+        db.query(
+            User.username,
+            func.sum(tiers.c.reps).label("total_reps"),
+            func.sum(tiers.c.sessions).label("sessions")
+        )
+        .join(tiers, tiers.c.user_id == User.id)
+        .group_by(User.id)
+        .order_by(func.sum(tiers.c.reps).desc())
+        .limit(10)
+        .all()
+    )
+    return [
+        {"rank": i + 1, "username": r.username, "total_reps": r.total_reps, "sessions": r.sessions}
+        for i, r in enumerate(results)
+    ]
+
+
+def exercise_dates(user: User, db: Session) -> list:
+    """All dates with at least one exercise, across raw rows and rollups."""
+    tiers = exercise_tiers()
+    results = db.query(tiers.c.date).filter(tiers.c.user_id == user.id).distinct().all()
+    return [datetime.strptime(str(r.date), "%Y-%m-%d").date() for r in results]
 
-# ============== Helper functions ==============
 
 def calculate_stats(user: User, db: Session) -> StatsResponse:
     """Calculate user statistics."""
-    exercises = db.query(Exercise).filter(Exercise.user_id == user.id).all()
+    tiers = exercise_tiers()
+    by_type = (
+        db.query(tiers.c.exercise_type, func.sum(tiers.c.reps), func.sum(tiers.c.sessions))
+        .filter(tiers.c.user_id == user.id)
+        .group_by(tiers.c.exercise_type)
+        .all()
+    )
 
-    today = datetime.utcnow().date()
-    today_exercises = [e for e in exercises if e.created_at.date() == today]
+    # Today is always inside the retention window, so raw rows are enough
+    today_exercises = (
+        db.query(Exercise)
+        .filter(Exercise.user_id == user.id)
+        .filter(Exercise.local_date == user.local_date())
+        .all()
+    )
 
     # Calculate streak
-    streak = calculate_streak(exercises)
+    streak = calculate_streak(exercise_dates(user, db), user)
 
     # Find favorite exercise
-    exercise_counts = {}
-    for e in exercises:
-        exercise_counts[e.exercise_type] = exercise_counts.get(e.exercise_type, 0) + e.reps
+    exercise_counts = {exercise_type: reps for exercise_type, reps, _ in by_type}
     favorite = max(exercise_counts, key=exercise_counts.get) if exercise_counts else None
 
     return StatsResponse(
-        total_reps=sum(e.reps for e in exercises),
-        total_sessions=len(exercises),
+        total_reps=sum(int(reps) for _, reps, _ in by_type),
+        total_sessions=sum(int(sessions) for _, _, sessions in by_type),
         current_streak=streak,
         reps_today=sum(e.reps for e in today_exercises),
         sessions_today=len(today_exercises),
@@ -277,13 +436,13 @@ def calculate_stats(user: User, db: Session) -> StatsResponse:
     )
 
 
-def calculate_streak(exercises: list) -> int:
+def calculate_streak(dates: list, user: User) -> int:
     """Calculate current streak (consecutive days with exercises)."""
-    if not exercises:
+    if not dates:
         return 0
 
-    dates = sorted(set(e.created_at.date() for e in exercises), reverse=True)
-    today = datetime.utcnow().date()
+    dates = sorted(set(dates), reverse=True)
+    today = datetime.strptime(user.local_date(), "%Y-%m-%d").date()
 
     # Must have exercised today or yesterday to have an active streak
     if dates[0] < today - timedelta(days=1):
@@ -402,17 +561,25 @@ MCP_TOOLS = [
 ]
 
 
+# MCP tools that write; only these count against the write rate limit
+MCP_WRITE_TOOLS = {"log_exercise_session", "log_daily_summary"}
+
+
 def handle_mcp_tool_call(tool_name: str, arguments: dict, user: User, db: Session) -> dict:
     """Handle an MCP tool call and return the result."""
 
     if tool_name == "log_exercise_session":
+        now = datetime.utcnow()
         exercise = Exercise(
             user_id=user.id,
             exercise_type=arguments["exercise"],
             reps=arguments["reps"],
-            duration=arguments.get("duration", 0)
+            duration=arguments.get("duration", 0),
+            created_at=now,
+            local_date=user.local_date(now)
         )
         db.add(exercise)
+        touch_user_data(user, db, now)
         db.commit()
         return {"status": "logged", "exercise": arguments["exercise"], "reps": arguments["reps"]}
 
@@ -421,36 +588,17 @@ def handle_mcp_tool_call(tool_name: str, arguments: dict, user: User, db: Sessio
         return stats.model_dump()
 
     elif tool_name == "get_leaderboard":
-        results = (
-            db.query(
-                User.username,
-                func.sum(Exercise.reps).label("total_reps"),
-                func.count(Exercise.id).label("sessions")
-            )
-            .join(Exercise)
-            .group_by(User.id)
-            .order_by(func.sum(Exercise.reps).desc())
-            .limit(10)
-            .all()
-        )
-        return {
-            "leaderboard": [
-                {"rank": i + 1, "username": r.username, "total_reps": r.total_reps, "sessions": r.sessions}
-                for i, r in enumerate(results)
-            ]
-        }
+        return {"leaderboard": calculate_leaderboard(db)}
 
     elif tool_name == "check_streak":
-        exercises = db.query(Exercise).filter(Exercise.user_id == user.id).all()
-        streak = calculate_streak(exercises)
+        streak = calculate_streak(exercise_dates(user, db), user)
         return {"current_streak": streak, "message": f"You're on a {streak} day streak!"}
 
     elif tool_name == "get_progress_today":
-        today = datetime.utcnow().date()
         today_exercises = (
             db.query(Exercise)
             .filter(Exercise.user_id == user.id)
-            .filter(func.date(Exercise.created_at) == today)
+            .filter(Exercise.local_date == user.local_date())
             .all()
         )
         reps_today = sum(e.reps for e in today_exercises)
@@ -466,73 +614,13 @@ def handle_mcp_tool_call(tool_name: str, arguments: dict, user: User, db: Sessio
         }
 
     elif tool_name == "log_daily_summary":
-        date = arguments.get("date") or datetime.utcnow().strftime("%Y-%m-%d")
-
-        existing = (
-            db.query(DailySummaryRecord)
-            .filter(DailySummaryRecord.user_id == user.id)
-            .filter(DailySummaryRecord.date == date)
-            .first()
-        )
-
-        if existing:
-            existing.lines_accepted += arguments.get("lines_accepted", 0)
-            existing.pull_requests += arguments.get("pull_requests", 0)
-            existing.commits += arguments.get("commits", 0)
-            existing.tokens_used += arguments.get("tokens_used", 0)
-        else:
-            existing = DailySummaryRecord(
-                user_id=user.id,
-                date=date,
-                lines_accepted=arguments.get("lines_accepted", 0),
-                pull_requests=arguments.get("pull_requests", 0),
-                commits=arguments.get("commits", 0),
-                tokens_used=arguments.get("tokens_used", 0)
-            )
-            db.add(existing)
-
-        db.commit()
-        return {
-            "status": "logged",
-            "date": date,
-            "lines_accepted": existing.lines_accepted,
-            "pull_requests": existing.pull_requests,
-            "commits": existing.commits,
-            "tokens_used": existing.tokens_used
-        }
+        date = arguments.get("date") or user.local_date()
+        metrics = DailySummary(**arguments).model_dump(exclude={"date"})
+        return accumulate_daily_summary(user, date, metrics, db)
 
     elif tool_name == "get_daily_summary":
-        date = arguments.get("date") or datetime.utcnow().strftime("%Y-%m-%d")
-
-        code_summary = (
-            db.query(DailySummaryRecord)
-            .filter(DailySummaryRecord.user_id == user.id)
-            .filter(DailySummaryRecord.date == date)
-            .first()
-        )
-
-        exercises = (
-            db.query(Exercise)
-            .filter(Exercise.user_id == user.id)
-            .filter(func.date(Exercise.created_at) == date)
-            .all()
-        )
-
-        exercise_totals = {}
-        for e in exercises:
-            exercise_totals[e.exercise_type] = exercise_totals.get(e.exercise_type, 0) + e.reps
-
-        return {
-            "date": date,
-            "code": {
-                "lines_accepted": code_summary.lines_accepted if code_summary else 0,
-                "pull_requests": code_summary.pull_requests if code_summary else 0,
-                "commits": code_summary.commits if code_summary else 0,
-                "tokens_used": code_summary.tokens_used if code_summary else 0
-            },
-            "exercises": exercise_totals,
-            "total_reps": sum(exercise_totals.values())
-        }
+        date = arguments.get("date") or user.local_date()
+        return calculate_daily_summary(user, date, db)
 
     else:
         raise ValueError(f"Unknown tool: {tool_name}")
@@ -556,8 +644,11 @@ async def mcp_endpoint(request: Request, db: Session = Depends(get_db)):
     def make_response(result):
         return {"jsonrpc": "2.0", "id": msg_id, "result": result}
 
-    def make_error(code, message):
-        return {"jsonrpc": "2.0", "id": msg_id, "error": {"code": code, "message": message}}
+    def make_error(code, message, data=None):
+        error = {"code": code, "message": message}
+        if data is not None:
+            error["data"] = data
+        return {"jsonrpc": "2.0", "id": msg_id, "error": error}
 
     # Handle initialization (no auth required)
     if method == "initialize":
@@ -586,13 +677,21 @@ async def mcp_endpoint(request: Request, db: Session = Depends(get_db)):
         tool_name = params.get("name")
         arguments = params.get("arguments", {})
 
+        # Reads (initialize, tools/list, stats tools) don't spend write tokens
+        write_guard = contextmanager(limit_writes)(request) if tool_name in MCP_WRITE_TOOLS else nullcontext()
         try:
-            result = handle_mcp_tool_call(tool_name, arguments, user, db)
-            return make_response({
-                "content": [{"type": "text", "text": json.dumps(result, indent=2)}]
-            })
-        except Exception as e:
-            return make_error(-32000, str(e))
+            with write_guard:
+                try:
+                    result = handle_mcp_tool_call(tool_name, arguments, user, db)
+                    return make_response({
+                        "content": [{"type": "text", "text": json.dumps(result, indent=2)}]
+                    })
+                except Exception as e:
+                    return make_error(-32000, str(e))
+        except HTTPException as e:
+            # Rate limited or busy: answer this id like any other failed call
+            retry_after = int((e.headers or {}).get("Retry-After", 1))
+            return make_error(-32000, e.detail, {"retry_after": retry_after})
 
     return make_error(-32601, f"Method not found: {method}")
 
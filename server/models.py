@@ -1,7 +1,11 @@
 """Database models for VibeReps server."""
 
-from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Float
+from datetime import datetime, time, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, DateTime, ForeignKey, Float, Index, UniqueConstraint
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 
@@ -17,22 +21,41 @@ class User(Base):
     username = Column(String(50), unique=True, nullable=False)
     api_key = Column(String(64), unique=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    timezone = Column(String(64), default="UTC")  # IANA name, used for day bucketing
+
+    # Bumped on every write to this user's exercises or summaries (response cache validator)
+    data_version = Column(Integer, default=0)
+    data_updated_at = Column(DateTime, default=datetime.utcnow)
 
     # Goals
     daily_rep_goal = Column(Integer, default=50)
     daily_session_goal = Column(Integer, default=3)
 
     exercises = relationship("Exercise", back_populates="user")
+    exercise_rollups = relationship("ExerciseRollup", back_populates="user")
 
     @property
     def total_reps(self):
-        return sum(e.reps for e in self.exercises)
+        return sum(e.reps for e in self.exercises) + sum(r.reps for r in self.exercise_rollups)
+
+    def local_date(self, when: Optional[datetime] = None) -> str:
+        """YYYY-MM-DD of a naive UTC datetime (default: now) in the user's time zone."""
+        when = when or datetime.utcnow()
+        local = when.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(self.timezone or "UTC"))
+        return local.strftime("%Y-%m-%d")
+
+    def day_start(self) -> datetime:
+        """Naive UTC datetime of the most recent local midnight in the user's time zone."""
+        tz = ZoneInfo(self.timezone or "UTC")
+        midnight = datetime.combine(datetime.now(tz).date(), time.min, tzinfo=tz)
+        return midnight.astimezone(timezone.utc).replace(tzinfo=None)
 
 
 class Exercise(Base):
     """Individual exercise session."""
 
     __tablename__ = "exercises"
+    __table_args__ = (Index("ix_exercises_user_local_date", "user_id", "local_date"),)
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -40,14 +63,33 @@ class Exercise(Base):
     reps = Column(Integer, nullable=False)
     duration = Column(Integer, default=0)  # seconds
     created_at = Column(DateTime, default=datetime.utcnow)
+    local_date = Column(String(10), index=True)  # YYYY-MM-DD in the user's time zone, set at insert
 
     user = relationship("User", back_populates="exercises")
 
 
+class ExerciseRollup(Base):
+    """Per-day exercise totals folded from raw rows past the retention window."""
+
+    __tablename__ = "exercise_rollups"
+    __table_args__ = (UniqueConstraint("user_id", "date", "exercise_type"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(String(10), nullable=False)  # YYYY-MM-DD
+    exercise_type = Column(String(50), nullable=False)
+    reps = Column(Integer, default=0)
+    sessions = Column(Integer, default=0)  # raw rows folded into this rollup
+    duration = Column(Integer, default=0)  # seconds
+
+    user = relationship("User", back_populates="exercise_rollups")
+
+
 class DailySummaryRecord(Base):
     """Daily code metrics summary."""
 
     __tablename__ = "daily_summaries"
+    __table_args__ = (UniqueConstraint("user_id", "date", name="uq_daily_summaries_user_date"),)
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -64,6 +106,80 @@ class DailySummaryRecord(Base):
     user = relationship("User")
 
 
+def upsert_increment(db, model, keys: dict, increments: dict, **values):
+    """
+    Add `increments` to the row matching `keys`, creating it if missing.
+
+    One INSERT ... ON CONFLICT DO UPDATE statement, so concurrent callers
+    accumulate instead of racing into duplicates. `keys` must match a unique
+    constraint on the table. Extra `values` are set on insert and update.
+    Returns the resulting row.
+    """
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    table = model.__table__
+
+    stmt = insert(table).values(**keys, **increments, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={
+            **{col: table.c[col] + stmt.excluded[col] for col in increments},
+            **{col: stmt.excluded[col] for col in values}
+        }
+    )
+    return db.execute(stmt.returning(*table.c)).one()
+
+
+def migrate(engine):
+    """Add columns introduced after a database was created (create_all skips existing tables)."""
+    inspector = inspect(engine)
+    columns = {
+        table: {c["name"] for c in inspector.get_columns(table)}
+        for table in ("users", "exercises")
+    }
+    summary_constraints = {c["name"] for c in inspector.get_unique_constraints("daily_summaries")}
+    summary_constraints |= {i["name"] for i in inspector.get_indexes("daily_summaries") if i["unique"]}
+    with engine.begin() as conn:
+        if "timezone" not in columns["users"]:
+            conn.execute(text("ALTER TABLE users ADD COLUMN timezone VARCHAR(64) DEFAULT 'UTC'"))
+        if "data_version" not in columns["users"]:
+            conn.execute(text("ALTER TABLE users ADD COLUMN data_version INTEGER DEFAULT 0"))
+            conn.execute(text("ALTER TABLE users ADD COLUMN data_updated_at TIMESTAMP"))
+            conn.execute(text("UPDATE users SET data_version = 0, data_updated_at = created_at"))
+        if "local_date" not in columns["exercises"]:
+            conn.execute(text("ALTER TABLE exercises ADD COLUMN local_date VARCHAR(10)"))
+            # Existing rows were bucketed by UTC date, keep that
+            if engine.dialect.name == "postgresql":
+                conn.execute(text("UPDATE exercises SET local_date = to_char(created_at, 'YYYY-MM-DD')"))
+            else:
+                conn.execute(text("UPDATE exercises SET local_date = date(created_at)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_exercises_local_date ON exercises (local_date)"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_exercises_user_local_date ON exercises (user_id, local_date)"
+            ))
+        if "uq_daily_summaries_user_date" not in summary_constraints:
+            # Merge duplicate (user_id, date) rows left by the old read-then-write logging
+            conn.execute(text("""
+                UPDATE daily_summaries SET
+                    lines_accepted = (SELECT SUM(d.lines_accepted) FROM daily_summaries d
+                                      WHERE d.user_id = daily_summaries.user_id AND d.date = daily_summaries.date),
+                    pull_requests = (SELECT SUM(d.pull_requests) FROM daily_summaries d
+                                     WHERE d.user_id = daily_summaries.user_id AND d.date = daily_summaries.date),
+                    commits = (SELECT SUM(d.commits) FROM daily_summaries d
+                               WHERE d.user_id = daily_summaries.user_id AND d.date = daily_summaries.date),
+                    tokens_used = (SELECT SUM(d.tokens_used) FROM daily_summaries d
+                                   WHERE d.user_id = daily_summaries.user_id AND d.date = daily_summaries.date)
+                WHERE id IN (SELECT MIN(id) FROM daily_summaries GROUP BY user_id, date HAVING COUNT(*) > 1)
+            """))
+            conn.execute(text("""
+                DELETE FROM daily_summaries
+                WHERE id NOT IN (SELECT MIN(id) FROM daily_summaries GROUP BY user_id, date)
+            """))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_daily_summaries_user_date ON daily_summaries (user_id, date)"
+            ))
+
+
 def init_db(database_url: str = "sqlite:///./vibereps.db"):
     """Initialize database and return session factory."""
     # SQLite needs check_same_thread=False, PostgreSQL doesn't
@@ -73,5 +189,6 @@ def init_db(database_url: str = "sqlite:///./vibereps.db"):
         # PostgreSQL (Supabase) - use connection pooling
         engine = create_engine(database_url, pool_pre_ping=True, pool_recycle=300)
     Base.metadata.create_all(engine)
+    migrate(engine)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     return SessionLocal
@@ -0,0 +1,130 @@
+"""
+Rate limiting and backpressure for write routes.
+
+- Token bucket per (route, API key): a client retrying /api/log in a tight
+  loop gets 429 with Retry-After instead of hammering the database.
+- Global in-flight cap on write routes: sheds load with 503 before the
+  database connection pool is exhausted.
+
+Buckets live in memory by default. Set RATE_LIMIT_BACKEND to a SQLite file
+path to share them between workers on the same host.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+# Sustained writes per minute per API key and route, plus burst allowance
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "20"))
+# "memory" or a SQLite file path shared by local workers
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Concurrent write requests per worker (keep below the DB pool size: 5 + 10 overflow by default)
+MAX_INFLIGHT_WRITES = int(os.getenv("MAX_INFLIGHT_WRITES", "10"))
+
+
+class MemoryBucketStore:
+    """Token buckets in a dict, for a single worker process."""
+
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+
+            if len(self._buckets) > self.MAX_KEYS:
+                # Idle long enough to be full again - same as not tracked
+                refill = burst / rate
+                self._buckets = {
+                    k: v for k, v in self._buckets.items() if now - v[1] < refill
+                }
+            return wait
+
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite file, shared by workers on one host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class RateLimiter:
+    """Token bucket limiter: `take()` returns 0 if allowed, else seconds to wait."""
+
+    def __init__(self, per_minute: float = RATE_LIMIT_PER_MINUTE, burst: float = RATE_LIMIT_BURST,
+                 backend: str = RATE_LIMIT_BACKEND):
+        self.rate = per_minute / 60.0
+        self.burst = max(burst, 1.0)
+        self.store = MemoryBucketStore() if backend == "memory" else SQLiteBucketStore(backend)
+
+    def take(self, route: str, client: str) -> float:
+        # Don't keep raw API keys around (especially in a shared file)
+        client_hash = hashlib.sha256(client.encode()).hexdigest()[:16]
+        try:
+            return self.store.take(f"{route}:{client_hash}", self.rate, self.burst, time.time())
+        except sqlite3.Error:
+            return 0.0  # Fail open - limiter trouble shouldn't take the API down
+
+
+class InFlightLimiter:
+    """Non-blocking cap on concurrent requests."""
+
+    def __init__(self, limit: int = MAX_INFLIGHT_WRITES):
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def acquire(self) -> bool:
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
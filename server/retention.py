@@ -0,0 +1,128 @@
+"""
+Retention job for raw exercise rows.
+
+Raw `exercises` rows older than the retention window are folded into
+per-day `exercise_rollups` and removed from the hot table. The removed rows
+can optionally be archived to gzip-compressed JSONL files first.
+
+Run once from the command line (e.g. from cron):
+
+    python retention.py
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from models import upsert_increment, Exercise, ExerciseRollup
+
+
+# Keep this many days of raw rows (0 disables the job)
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))
+# Hours between runs when scheduled from the server lifespan
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "24"))
+# Directory for compressed archives of compacted rows (empty = delete without archiving)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")
+
+BATCH_SIZE = 5000
+
+
+def archive_rows(rows: list, archive_file: Path):
+    """Append raw rows to a gzip JSONL archive (one gzip member per batch)."""
+    archive_file.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(archive_file, "at") as f:
+        for e in rows:
+            f.write(json.dumps({
+                "id": e.id,
+                "user_id": e.user_id,
+                "exercise": e.exercise_type,
+                "reps": e.reps,
+                "duration": e.duration,
+                "created_at": e.created_at.isoformat() if e.created_at else None,
+                "local_date": e.local_date
+            }) + "\n")
+
+
+def fold_into_rollups(rows: list, db: Session):
+    """Add raw rows to the matching per-day rollup rows."""
+    totals = {}
+    for e in rows:
+        key = (e.user_id, e.local_date, e.exercise_type)
+        reps, sessions, duration = totals.get(key, (0, 0, 0))
+        totals[key] = (reps + e.reps, sessions + 1, duration + (e.duration or 0))
+
+    for (user_id, date, exercise_type), (reps, sessions, duration) in totals.items():
+        upsert_increment(
+            db,
+            ExerciseRollup,
+            keys={"user_id": user_id, "date": date, "exercise_type": exercise_type},
+            increments={"reps": reps, "sessions": sessions, "duration": duration}
+        )
+
+
+def compact_exercises(
+    db: Session,
+    retention_days: int = RETENTION_DAYS,
+    archive_dir: Optional[str] = ARCHIVE_DIR,
+    now: Optional[datetime] = None
+) -> dict:
+    """
+    Fold raw rows older than `retention_days` into per-day rollups.
+
+    Works in batches so the hot table is never locked for the whole run.
+    Cutoff compares each row's local date, so a user's day is always either
+    fully raw or fully rolled up. Returns counts for logging.
+    """
+    if retention_days < 1:
+        return {"compacted": 0, "cutoff": None}
+
+    now = now or datetime.utcnow()
+    cutoff = (now.date() - timedelta(days=retention_days)).strftime("%Y-%m-%d")
+    archive_file = None
+    if archive_dir:
+        archive_file = Path(archive_dir) / f"exercises-{cutoff.replace('-', '')}-{now:%Y%m%dT%H%M%S}.jsonl.gz"
+
+    compacted = 0
+    while True:
+        rows = (
+            db.query(Exercise)
+            .filter(Exercise.local_date < cutoff)
+            .order_by(Exercise.id)
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+
+        try:
+            if archive_file:
+                archive_rows(rows, archive_file)
+            fold_into_rollups(rows, db)
+            db.query(Exercise).filter(Exercise.id.in_([e.id for e in rows])).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        compacted += len(rows)
+
+    return {
+        "compacted": compacted,
+        "cutoff": cutoff,
+        "archive": str(archive_file) if archive_file and compacted else None
+    }
+
+
+if __name__ == "__main__":
+    from main import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(json.dumps(compact_exercises(db)))
+    finally:
+        db.close()
@@ -0,0 +1,57 @@
+"""
+Monthly rotation of the local exercise log (exercise_log.py).
+
+    python -m unittest discover tests
+"""
+
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from exercise_log import iter_entries, iter_segment_lines, list_segments, rotate_if_needed, segment_dir, write_segment
+
+
+def line(timestamp, exercise="squats", reps=10):
+    return (json.dumps({"timestamp": timestamp, "exercise": exercise, "reps": reps}) + "\n").encode()
+
+
+class RotationTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp(prefix="vibereps-log-test-"))
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.log = self.dir / "exercises.jsonl"
+        self.old = [line("2026-01-05T09:00:00"), line("2026-01-20T09:00:00", "pushups"),
+                    line("2026-02-03T09:00:00")]
+        self.new = [line("2026-03-01T09:00:00", reps=12)]
+        self.log.write_bytes(b"".join(self.old + self.new))
+        self.now = datetime(2026, 3, 2)
+
+    def segment_lines(self):
+        return [list(iter_segment_lines(path)) for path in list_segments(self.log)]
+
+    def test_rotate(self):
+        self.assertTrue(rotate_if_needed(self.log, self.now))
+        self.assertEqual(self.segment_lines(), [self.old[:2], self.old[2:]])
+        self.assertEqual(self.log.read_bytes(), b"".join(self.new))
+        self.assertEqual([e["reps"] for e in iter_entries(self.log)], [10, 10, 10, 12])
+        self.assertFalse(rotate_if_needed(self.log, self.now))
+
+    def test_interrupted_rotation_is_not_counted_twice(self):
+        # Stopped after writing January's segment, before replacing the active log
+        segment_dir(self.log).mkdir()
+        write_segment(segment_dir(self.log) / "exercises-2026-01.jsonl.gz", "2026-01", self.old[:2])
+
+        self.assertTrue(rotate_if_needed(self.log, self.now))
+        self.assertEqual(self.segment_lines(), [self.old[:2], self.old[2:]])
+        self.assertEqual(len(list(iter_entries(self.log))), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
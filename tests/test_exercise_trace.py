@@ -0,0 +1,208 @@
+"""
+Trace files (exercise_trace.py) and the tracker's /trace endpoints.
+
+    python -m unittest discover tests
+"""
+
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from http.server import HTTPServer
+from pathlib import Path
+from unittest import mock
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+import exercise_trace
+from exercise_trace import (
+    HEADER_SIZE, MAGIC, NUM_LANDMARKS, RECORD, RECORD_SIZE, TraceError, append_frames,
+    create_trace, finish_trace, frame_count, iter_frames, list_traces, load_trace, read_header
+)
+
+
+def records(count, start=0):
+    """`count` frame records; landmark values encode the frame and landmark index."""
+    return b"".join(
+        RECORD.pack(1000.0 + i, *(float(i * 1000 + n) for n in range(NUM_LANDMARKS * 4)))
+        for i in range(start, start + count)
+    )
+
+
+class TraceFileTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp(prefix="vibereps-trace-test-"))
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def test_round_trip(self):
+        detection = {"type": "angle", "thresholds": {"down": 120, "up": 150}}
+        path = create_trace("squats", detection, "quick", trace_dir=self.dir)
+        self.assertEqual(list_traces(self.dir), [path])
+        self.assertEqual(path.stat().st_size, HEADER_SIZE)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(len(MAGIC)), MAGIC)
+
+        self.assertEqual(append_frames(path, records(3)), 3)
+        self.assertEqual(append_frames(path, records(2, start=3)), 5)
+        self.assertEqual(append_frames(path, b""), 5)
+
+        header = finish_trace(path, reps=4)
+        self.assertEqual(header, read_header(path))
+        self.assertEqual((header["exercise"], header["mode"], header["detection"]), ("squats", "quick", detection))
+        self.assertEqual((header["reps"], header["frames"]), (4, 5))
+        self.assertIsNotNone(header["finished"])
+        self.assertEqual(header["id"], path.stem.rsplit("-", 1)[-1])
+        # Rewriting the header leaves the frames where they were
+        self.assertEqual(path.stat().st_size, HEADER_SIZE + 5 * RECORD_SIZE)
+
+        frames = list(iter_frames(path))
+        self.assertEqual([t for t, _ in frames], [1000.0, 1001.0, 1002.0, 1003.0, 1004.0])
+        self.assertEqual(frames[4][1][:2], (4000.0, 4001.0))
+
+    def test_load_trace(self):
+        if exercise_trace.np is None:
+            self.skipTest("load_trace needs numpy")
+        np = exercise_trace.np
+        path = create_trace("pushups", trace_dir=self.dir)
+        header, timestamps, landmarks = load_trace(path)
+        self.assertEqual((timestamps.shape, landmarks.shape), ((0,), (0, NUM_LANDMARKS, 4)))
+
+        append_frames(path, records(6))
+        header, timestamps, landmarks = load_trace(path)
+        self.assertEqual(header["exercise"], "pushups")
+        self.assertEqual(landmarks.shape, (6, NUM_LANDMARKS, 4))
+        self.assertEqual(landmarks.dtype, np.float32)
+        np.testing.assert_array_equal(timestamps, 1000.0 + np.arange(6))
+        self.assertEqual(float(landmarks[2, 1, 3]), 2007.0)  # frame 2, landmark 1, visibility
+
+    def test_torn_record_is_dropped(self):
+        path = create_trace("squats", trace_dir=self.dir)
+        append_frames(path, records(2))
+        # An upload cut off mid-record
+        with open(path, "ab") as f:
+            f.write(records(1, start=2)[:100])
+        self.assertEqual(frame_count(path), 2)
+        self.assertEqual(len(list(iter_frames(path))), 2)
+
+        self.assertEqual(append_frames(path, records(1, start=3)), 3)
+        self.assertEqual(path.stat().st_size, HEADER_SIZE + 3 * RECORD_SIZE)
+        self.assertEqual([t for t, _ in iter_frames(path)], [1000.0, 1001.0, 1003.0])
+
+    def test_rejects_partial_records(self):
+        path = create_trace("squats", trace_dir=self.dir)
+        with self.assertRaises(TraceError):
+            append_frames(path, records(2)[:-1])
+        self.assertEqual(frame_count(path), 0)
+
+    def test_max_frames(self):
+        path = create_trace("squats", trace_dir=self.dir)
+        with mock.patch.object(exercise_trace, "MAX_FRAMES", 4):
+            self.assertEqual(append_frames(path, records(3)), 3)
+            with self.assertRaises(TraceError):
+                append_frames(path, records(2, start=3))
+            self.assertEqual(append_frames(path, records(1, start=3)), 4)
+            with self.assertRaises(TraceError):
+                append_frames(path, records(1, start=4))
+        self.assertEqual(frame_count(path), 4)
+
+    def test_validation(self):
+        for exercise in ("", "../squats", "a/b", None, "x" * 65):
+            with self.assertRaises(TraceError):
+                create_trace(exercise, trace_dir=self.dir)
+        path = create_trace("squats", trace_dir=self.dir)
+        for reps in ("10", -1, 1.5, True):
+            with self.assertRaises(TraceError):
+                finish_trace(path, reps=reps)
+        self.assertIsNone(read_header(path)["finished"])
+
+        not_a_trace = self.dir / "other.trace"
+        not_a_trace.write_bytes(b"{}")
+        with self.assertRaises(TraceError):
+            read_header(not_a_trace)
+
+
+class TraceEndpointTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The hook exits at import when disabled or paused
+        argv = sys.argv
+        sys.argv = ["exercise_tracker.py"]
+        try:
+            import exercise_tracker
+        except SystemExit:
+            raise unittest.SkipTest("exercise_tracker is disabled or paused here")
+        finally:
+            sys.argv = argv
+        cls.tracker = exercise_tracker
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp(prefix="vibereps-trace-test-"))
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        patches = [
+            mock.patch.object(self.tracker, "VIBEREPS_TRACE", "1"),
+            mock.patch.object(self.tracker.ExerciseHTTPHandler, "traces", {}),
+            # Keep test traces out of ~/.vibereps
+            mock.patch.object(exercise_trace.create_trace, "__defaults__", (None, None, self.dir)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.server = HTTPServer(("localhost", 0), self.tracker.ExerciseHTTPHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def post(self, path, body, content_type="application/json"):
+        request = urllib.request.Request(
+            f"http://localhost:{self.server.server_port}{path}", data=body,
+            headers={"Content-Type": content_type}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def test_record_a_trace(self):
+        status, started = self.post("/trace/start", b'{"exercise": "squats", "mode": "normal"}')
+        self.assertEqual(status, 200)
+        trace = started["trace"]
+        self.assertEqual(self.post(f"/trace/frames?trace={trace}", records(4), "application/octet-stream"),
+                         (200, {"trace": trace, "frames": 4}))
+        self.assertEqual(self.post("/trace/finish", json.dumps({"trace": trace, "reps": 2}).encode()),
+                         (200, {"trace": trace, "frames": 4, "reps": 2}))
+
+        header = read_header(list_traces(self.dir)[0])
+        self.assertEqual(header["detection"]["type"], "angle")  # From exercises/squats.json
+        # Finished traces take no more frames
+        self.assertEqual(self.post(f"/trace/frames?trace={trace}", records(1), "application/octet-stream")[0], 404)
+
+    def test_bad_requests(self):
+        for body in (b"[]", b'"x"', b"1", b"null", b"{", b'{"exercise": ["squats"]}',
+                     b'{"exercise": "../x"}', b'{"exercise": "squats", "mode": 1}'):
+            self.assertEqual(self.post("/trace/start", body)[0], 400, body)
+        self.assertEqual(list_traces(self.dir), [])
+
+        trace = self.post("/trace/start", b'{"exercise": "squats"}')[1]["trace"]
+        for body in (b"[]", b'"x"', b"{", json.dumps({"trace": trace, "reps": "ten"}).encode()):
+            self.assertEqual(self.post("/trace/finish", body)[0], 400, body)
+        self.assertEqual(self.post("/trace/finish", b'{"trace": ["x"]}')[0], 404)
+        self.assertEqual(self.post(f"/trace/frames?trace={trace}", b"x" * 5, "application/octet-stream")[0], 400)
+        self.assertEqual(self.post("/trace/frames?trace=unknown", records(1), "application/octet-stream")[0], 404)
+        # A rejected finish leaves the trace open
+        self.assertEqual(self.post("/trace/finish", json.dumps({"trace": trace, "reps": 0}).encode())[0], 200)
+
+    def test_off_by_default(self):
+        with mock.patch.object(self.tracker, "VIBEREPS_TRACE", ""):
+            self.assertEqual(self.post("/trace/start", b'{"exercise": "squats"}')[0], 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
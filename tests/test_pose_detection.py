@@ -0,0 +1,230 @@
+"""
+Replays synthetic pose streams through each detection type and checks the
+rep counts, using the shipped exercises/*.json configs where one exists.
+
+    python -m unittest discover tests
+"""
+
+import json
+import math
+import sys
+import unittest
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is not None:
+    from pose_detection import Detector, load_catalog, validate_exercise
+
+REPS = 4
+NOSE = 0
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+LEFT_HIP, RIGHT_HIP = 23, 24
+LEFT_KNEE, RIGHT_KNEE = 25, 26
+LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+LEFT_HEEL, RIGHT_HEEL = 29, 30
+LEFT_TOE, RIGHT_TOE = 31, 32
+
+
+def standing():
+    """One frame of a person standing square to the camera, all landmarks visible."""
+    frame = np.full((33, 4), 0.5, dtype=np.float32)
+    frame[:, 2] = 0
+    frame[:, 3] = 1
+    points = {
+        NOSE: (0.5, 0.2),
+        LEFT_SHOULDER: (0.4, 0.3), RIGHT_SHOULDER: (0.6, 0.3),
+        LEFT_ELBOW: (0.35, 0.45), RIGHT_ELBOW: (0.65, 0.45),
+        LEFT_WRIST: (0.35, 0.6), RIGHT_WRIST: (0.65, 0.6),
+        LEFT_HIP: (0.4, 0.6), RIGHT_HIP: (0.6, 0.6),
+        LEFT_KNEE: (0.45, 0.8), RIGHT_KNEE: (0.55, 0.8),
+        LEFT_ANKLE: (0.45, 1.0), RIGHT_ANKLE: (0.55, 1.0),
+        LEFT_HEEL: (0.45, 0.9), RIGHT_HEEL: (0.55, 0.9),
+        LEFT_TOE: (0.45, 0.9), RIGHT_TOE: (0.55, 0.9),
+    }
+    for i, (x, y) in points.items():
+        frame[i, :2] = x, y
+    return frame
+
+
+def stream(*poses, reps=REPS, hold=5):
+    """
+    `reps` cycles through `poses` (functions editing a frame), each held for
+    `hold` frames, then back to standing.
+    """
+    frames = []
+    for _ in range(reps):
+        for pose in poses:
+            frame = standing()
+            pose(frame)
+            frames.extend([frame] * hold)
+    frames.extend([standing()] * hold)
+    return np.stack(frames)
+
+
+def rest(frame):
+    pass
+
+
+@unittest.skipIf(np is None, "pose_detection needs numpy")
+class DetectionTypeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog = load_catalog()
+
+    def count(self, exercise, frames):
+        return self.catalog[exercise].count(frames)
+
+    def test_catalog_is_valid(self):
+        for path in sorted((REPO_DIR / "exercises").glob("*.json")):
+            if not path.name.startswith("_"):
+                self.assertIn(path.stem, self.catalog)
+        for detector in self.catalog.values():
+            self.assertEqual(validate_exercise(detector.config), [])
+
+    def test_angle(self):
+        def knees(angle):
+            def pose(frame):
+                # Ankle `angle` degrees round the knee from the hip
+                direction = math.radians(angle - 90)
+                for knee, ankle in ((LEFT_KNEE, LEFT_ANKLE), (RIGHT_KNEE, RIGHT_ANKLE)):
+                    hip = frame[knee, :2] - (0, 0.2)
+                    frame[knee - 2, :2] = hip
+                    frame[ankle, :2] = frame[knee, :2] + 0.2 * np.array((math.cos(direction), math.sin(direction)))
+            return pose
+
+        self.assertEqual(self.count("squats", stream(knees(170), knees(90))), REPS)
+        # Not deep enough
+        self.assertEqual(self.count("squats", stream(knees(170), knees(130))), 0)
+
+    def test_angle_ignores_hidden_frames(self):
+        def bent(frame):
+            frame[LEFT_ANKLE, :2] = frame[LEFT_KNEE, :2] + (0.2, 0)
+            frame[RIGHT_ANKLE, :2] = frame[RIGHT_KNEE, :2] + (0.2, 0)
+
+        def hidden(frame):
+            frame[:, 3] = 0.1
+
+        def bent_hidden(frame):
+            bent(frame)
+            hidden(frame)
+
+        # Leaving the frame mid-squat neither counts nor resets the rep
+        self.assertEqual(self.count("squats", stream(rest, bent, hidden, rest)), REPS)
+        # A squat the camera didn't see isn't counted
+        self.assertEqual(self.count("squats", stream(rest, bent_hidden)), 0)
+
+    def test_height_baseline(self):
+        def shrug(frame):
+            frame[[LEFT_SHOULDER, RIGHT_SHOULDER], 1] -= 0.05
+
+        self.assertEqual(self.count("shoulder_shrugs", stream(rest, shrug)), REPS)
+
+    def test_height_relative(self):
+        def raise_heels(frame):
+            frame[[LEFT_HEEL, RIGHT_HEEL], 1] -= 0.04
+
+        self.assertEqual(self.count("calf_raises", stream(rest, raise_heels)), REPS)
+
+    def test_height_relative_either(self):
+        def left_knee_up(frame):
+            frame[LEFT_KNEE, 1] = 0.5
+
+        def right_knee_up(frame):
+            frame[RIGHT_KNEE, 1] = 0.5
+
+        self.assertEqual(self.count("high_knees", stream(rest, left_knee_up, rest, right_knee_up)), 2 * REPS)
+
+    def test_position_relative(self):
+        def arms_up(frame):
+            frame[[LEFT_WRIST, RIGHT_WRIST], 1] = 0.1
+
+        self.assertEqual(self.count("jumping_jacks", stream(rest, arms_up)), REPS)
+
+    def test_position_baseline(self):
+        # No shipped exercise uses this type
+        detector = Detector({
+            "id": "chin_tucks", "name": "Chin Tucks", "reps": {"normal": 10, "quick": 5},
+            "detection": {
+                "type": "position_baseline", "axis": "y",
+                "landmarks": {"target": [NOSE], "reference": [LEFT_SHOULDER, RIGHT_SHOULDER]},
+                "thresholds": {"trigger": 0.1}
+            }
+        })
+
+        def tuck(frame):
+            frame[NOSE, 1] = 0.35
+
+        self.assertEqual(detector.count(stream(rest, tuck)), REPS)
+
+        # A baseline of exactly 0 is taken again on the next frame, as the
+        # browser's `if (!detectionState.baseline)` does
+        def level(frame):
+            frame[NOSE, 1] = 0.3
+
+        frames = np.concatenate([stream(level, reps=1, hold=1), stream(rest, tuck)])
+        self.assertEqual(detector.count(frames), REPS)
+
+    def test_distance(self):
+        def crunch(frame):
+            frame[LEFT_ELBOW, :2] = frame[RIGHT_KNEE, :2] + (-0.02, -0.05)
+
+        self.assertEqual(self.count("standing_crunches", stream(rest, crunch)), REPS)
+
+    def test_tilt(self):
+        def lean(frame):
+            frame[[LEFT_SHOULDER, RIGHT_SHOULDER], 0] += 0.05
+
+        self.assertEqual(self.count("side_stretches", stream(rest, lean)), REPS)
+
+        def head_turn(frame):
+            frame[NOSE, 0] += 0.08
+
+        self.assertEqual(self.count("neck_rotations", stream(rest, head_turn)), REPS)
+
+    def test_width_ratio(self):
+        def twist(frame):
+            frame[[LEFT_SHOULDER, RIGHT_SHOULDER], 0] = 0.45, 0.55
+
+        self.assertEqual(self.count("torso_twists", stream(rest, twist)), REPS)
+
+        # Side-on first frame: 0 / 0 is NaN, so the browser takes the baseline later
+        def side_on(frame):
+            frame[[LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP], 0] = 0.5
+
+        frames = np.concatenate([stream(side_on, reps=1, hold=1), stream(rest, twist)])
+        self.assertEqual(self.count("torso_twists", frames), REPS)
+
+    def test_quadrant_tracking(self):
+        # Right wrist circles its shoulder, 15 degrees per frame. A rep is
+        # counted once 20 frames of history cover all four quadrants (the
+        # 20th frame here, at 285 degrees), then the history starts over
+        frames = []
+        for i in range(120):
+            frame = standing()
+            angle = math.radians(15 * i)
+            frame[RIGHT_WRIST, :2] = frame[RIGHT_SHOULDER, :2] + 0.15 * np.array((math.cos(angle), math.sin(angle)))
+            frames.append(frame)
+        detector = self.catalog["arm_circles"]
+        self.assertEqual(detector.rep_frames(np.stack(frames)).tolist(), [19, 39, 59, 79, 99, 119])
+
+        # Arms still: no reps
+        self.assertEqual(detector.count(stream(rest)), 0)
+
+        # The browser only leaves its counted state on a frame with less
+        # history than minHistoryForDetection, so a minimum of 1 counts once
+        config = json.loads(json.dumps(detector.config))
+        config["detection"]["minHistoryForDetection"] = 1
+        self.assertEqual(Detector(config).rep_frames(np.stack(frames)).tolist(), [16])
+
+
+if __name__ == "__main__":
+    unittest.main()
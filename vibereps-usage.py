@@ -6,64 +6,89 @@ Shows Claude Code usage alongside exercise reps in a combined daily view.
 Matches ccusage table format with added exercise columns.
 """
 
+import hashlib
 import json
+import os
+import shutil
+import sqlite3
 import subprocess
 import sys
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from claude_usage import claude_data_dirs, daily_usage
+from exercise_columns import ExerciseColumns
+from exercise_log import LOG_FILE, ExerciseIndex, read_appended, timestamp_to_local_date
 
-def timestamp_to_local_date(ts: str) -> str:
-    """Convert ISO timestamp to local YYYY-MM-DD date."""
-    from datetime import datetime
-    try:
-        # Handle both UTC (with Z) and local (without Z) timestamps
-        if ts.endswith('Z'):
-            dt = datetime.fromisoformat(ts.replace('Z', '+00:00'))
-        elif '+' in ts or ts.count('-') > 2:
-            # Has timezone info
-            dt = datetime.fromisoformat(ts)
-        else:
-            # No timezone, assume local
-            dt = datetime.fromisoformat(ts)
-            return dt.strftime('%Y-%m-%d')
-        # Convert to local time
-        local_dt = dt.astimezone()
-        return local_dt.strftime('%Y-%m-%d')
-    except (ValueError, AttributeError):
-        # Fallback: just split on T
-        return ts.split("T")[0] if "T" in ts else ts[:10]
-
-
-def load_exercise_data():
-    """Load exercise data from local JSONL file."""
-    log_file = Path.home() / ".vibereps" / "exercises.jsonl"
-
-    if not log_file.exists():
-        return {}
 
-    # Group by date and exercise type
-    by_date = defaultdict(lambda: defaultdict(int))
+def load_exercise_data(since: str = None, until: str = None):
+    """
+    Load per-day exercise totals from the local log.
 
-    with open(log_file) as f:
-        for line in f:
-            try:
-                entry = json.loads(line.strip())
-                ts = entry.get("timestamp", "")
-                date = timestamp_to_local_date(ts)
-                exercise = entry.get("exercise", "unknown")
-                reps = entry.get("reps", 0)
-                # Skip internal states and zero-rep entries
-                if exercise.startswith("_") or reps <= 0:
-                    continue
-                by_date[date][exercise] += reps
-            except (json.JSONDecodeError, KeyError):
-                continue
+    Without a date range this reads the index. With one, only that range of
+    the log is decoded (binary search over the time-ordered lines), so a
+    short range costs the same however long the log is.
+    """
+    if not LOG_FILE.exists():
+        return {}
+
+    if not since and not until:
+        try:
+            with ExerciseIndex(LOG_FILE) as index:
+                return index.daily_totals()
+        except (sqlite3.Error, OSError):
+            pass  # Index unavailable (e.g. read-only directory) - scan the log
 
-    return dict(by_date)
+    return ExerciseColumns.load(LOG_FILE, since, until).totals_by_day_and_exercise()
 
 
-def get_ccusage_data(args):
+def load_exercise_state(since: str = None, until: str = None):
+    """
+    (exercise_data, position) for --watch: the per-day totals and the
+    (identity, offset) of the log they cover, so later appends can be added
+    with `fold_appended`. position is None if the index is unavailable.
+    """
+    if not LOG_FILE.exists():
+        return {}, None
+    try:
+        with ExerciseIndex(LOG_FILE) as index:
+            return index.daily_totals(since, until), index.position
+    except (sqlite3.Error, OSError):
+        return load_exercise_data(since, until), None
+
+
+def fold_appended(exercise_data: dict, position, since: str = None, until: str = None):
+    """
+    Add entries appended to the log after `position` to their days in
+    `exercise_data` (in place). Returns (new position, whether anything was
+    added), or None if the log was replaced or shrank and must be reloaded.
+    """
+    identity, offset = position
+    try:
+        with open(LOG_FILE, "rb") as f:
+            st = os.fstat(f.fileno())
+            if f"{st.st_dev}:{st.st_ino}" != identity or st.st_size < offset:
+                return None
+            entries, offset = read_appended(f, offset)
+    except FileNotFoundError:
+        return None if identity else (position, False)
+
+    added = False
+    for entry in entries:
+        day = timestamp_to_local_date(entry.get("timestamp", ""))
+        if (since or "") <= day <= (until or "9999-99-99"):
+            totals = exercise_data.setdefault(day, {})
+            exercise = entry.get("exercise", "unknown")
+            totals[exercise] = totals.get(exercise, 0) + entry["reps"]
+            added = True
+    return (identity, offset), added
+
+
+def run_ccusage(args):
     """Run ccusage and get JSON output."""
     try:
         cmd = ["npx", "ccusage", "daily", "--json"] + args
@@ -75,6 +100,229 @@ def get_ccusage_data(args):
     return None
 
 
+def fetch_usage(since, until, engine: str):
+    """Daily usage for a date range from the built-in parser or ccusage."""
+    if engine == "native":
+        data = daily_usage(since, until)
+        if data is not None:
+            return data
+        # No transcripts found here - let ccusage look
+    args = []
+    if since:
+        args += ["--since", since.replace("-", "")]
+    if until:
+        args += ["--until", until.replace("-", "")]
+    return run_ccusage(args)
+
+
+# ============== ccusage cache ==============
+#
+# Usage for a day that is over can't change, so past-day rows are kept in
+# ~/.vibereps/ccusage-cache.json and usage is only read for days after the
+# cached range (normally just today). The cache is dropped if Claude Code's
+# usage files from the cached period change (deleted, replaced or imported).
+
+CCUSAGE_CACHE_FILE = LOG_FILE.parent / "ccusage-cache.json"
+
+
+def parse_date_arg(value: str):
+    """YYYYMMDD or YYYY-MM-DD -> YYYY-MM-DD, None if it isn't a date."""
+    digits = value.replace("-", "")
+    if len(digits) != 8 or not digits.isdigit():
+        return None
+    return f"{digits[:4]}-{digits[4:6]}-{digits[6:]}"
+
+
+def split_range_args(args: list):
+    """Pull --since/--until out of ccusage args. Returns (since, until, other_args), or None."""
+    since = until = None
+    other = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        name, _, value = arg.partition("=")
+        if name in ("--since", "-s", "--until", "-u"):
+            if not value:
+                if i + 1 >= len(args):
+                    return None
+                value = args[i + 1]
+                i += 1
+            parsed = parse_date_arg(value)
+            if not parsed:
+                return None
+            if name in ("--since", "-s"):
+                since = parsed
+            else:
+                until = parsed
+        else:
+            other.append(arg)
+        i += 1
+    return since, until, other
+
+
+def transcript_dirs(known: dict = None) -> dict:
+    """
+    {directory: [mtime_ns, subdirectories, .jsonl file names, ...]} for every
+    directory under Claude Code's projects folders.
+
+    A directory whose mtime matches its entry in `known` has the same
+    entries, so that entry is reused without listing the directory again.
+    """
+    known = known or {}
+    dirs = {}
+    pending = [data_dir / "projects" for data_dir in claude_data_dirs()]
+    while pending:
+        path = pending.pop()
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            continue
+        entry = known.get(str(path))
+        if not entry or entry[0] != mtime:
+            subdirs, files = [], []
+            try:
+                with os.scandir(path) as it:
+                    for item in it:
+                        if item.is_dir(follow_symlinks=False):
+                            subdirs.append(item.name)
+                        elif item.name.endswith(".jsonl"):
+                            files.append(item.name)
+            except OSError:
+                continue
+            entry = [mtime, sorted(subdirs), sorted(files)]
+        dirs[str(path)] = entry
+        pending.extend(path / name for name in entry[1])
+    return dirs
+
+
+def claude_usage_fingerprint(before: float, known: dict = None):
+    """
+    (fingerprint, dirs) of the usage files last modified before `before` (epoch seconds).
+
+    `known` is the `dirs` of an earlier call with the same `before`. Files are
+    only stat-ed in directories that changed since then (a session was added,
+    removed or renamed); an unchanged tree costs one stat() per directory.
+    Appending to a transcript doesn't change its directory, but appends are
+    new messages, not usage for past days.
+    """
+    known = known or {}
+    digest = hashlib.sha1()
+    dirs = transcript_dirs(known)
+    for path in sorted(dirs):
+        entry = dirs[path]
+        if len(entry) < 4:
+            files = hashlib.sha1()
+            for name in entry[2]:
+                try:
+                    st = os.stat(os.path.join(path, name))
+                except OSError:
+                    continue
+                if st.st_mtime < before:
+                    files.update(f"{name}:{st.st_size}:{int(st.st_mtime)}\n".encode())
+            entry.append(files.hexdigest())
+        digest.update(f"{path}:{entry[3]}\n".encode())
+    return digest.hexdigest(), dirs
+
+
+def day_start(day: str) -> float:
+    """Epoch seconds of local midnight at the start of a YYYY-MM-DD day."""
+    return time.mktime(datetime.strptime(day, "%Y-%m-%d").timetuple())
+
+
+def next_day(day: str) -> str:
+    return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def load_ccusage_cache() -> dict:
+    try:
+        cache = json.loads(CCUSAGE_CACHE_FILE.read_text())
+        if isinstance(cache.get("days"), dict) and cache.get("covered_until"):
+            return cache
+    except (OSError, json.JSONDecodeError, AttributeError):
+        pass
+    return {}
+
+
+def save_ccusage_cache(cache: dict):
+    try:
+        CCUSAGE_CACHE_FILE.parent.mkdir(exist_ok=True)
+        tmp = CCUSAGE_CACHE_FILE.with_suffix(".tmp")
+        tmp.write_text(json.dumps(cache))
+        os.replace(tmp, CCUSAGE_CACHE_FILE)
+    except OSError:
+        pass  # Cache is an optimization only
+
+
+def get_ccusage_data(args, use_cache: bool = True, engine: str = "ccusage"):
+    """
+    Daily usage in ccusage's JSON shape, answering past days from the cache.
+
+    `engine` is "ccusage" (npx) or "native" (parse transcripts in-process).
+    """
+    parsed = split_range_args(args)
+    if parsed is None or parsed[2]:
+        # Options that change ccusage's output (--breakdown, --project, ...) need ccusage itself
+        return run_ccusage(args)
+    since, until, _ = parsed
+    if not use_cache:
+        return fetch_usage(since, until, engine)
+
+    today = date.today().isoformat()
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+
+    # Cache covers every past day in [covered_since, covered_until] ("" = from the beginning)
+    cache = load_ccusage_cache()
+    if cache:
+        fingerprint, dirs = claude_usage_fingerprint(day_start(next_day(cache["covered_until"])), cache.get("dirs"))
+        if (cache.get("engine") != engine
+                or (since or "") < cache["covered_since"]
+                or cache.get("fingerprint") != fingerprint):
+            cache = {}
+
+    if not cache or not (until and until <= cache["covered_until"]):
+        # Fetch everything after the cached range so coverage stays contiguous
+        fetch_since = next_day(cache["covered_until"]) if cache else since
+        fresh = fetch_usage(fetch_since, until, engine)
+        if fresh is None:
+            if not cache:
+                return None
+            # Nothing was read: keep the cache as it is rather than record
+            # the uncovered days as having no usage
+            days, fresh_days = cache["days"], {}
+        else:
+            days = cache.get("days", {})
+            fresh_days = {row.get("date", ""): row for row in fresh.get("daily", [])}
+            days.update({day: row for day, row in fresh_days.items() if day < today})
+
+            covered_until = min(until or yesterday, yesterday)
+            if cache:
+                covered_until = max(covered_until, cache["covered_until"])
+            if fresh.get("daily") is not None and covered_until >= (fetch_since or ""):
+                if not cache or covered_until != cache["covered_until"]:
+                    # A new `before`: every directory's files are hashed again
+                    fingerprint, dirs = claude_usage_fingerprint(day_start(next_day(covered_until)))
+                cache = {
+                    "engine": engine,
+                    "covered_since": cache.get("covered_since", since or ""),
+                    "covered_until": covered_until,
+                    "fingerprint": fingerprint,
+                    "dirs": dirs,
+                    "days": days
+                }
+                save_ccusage_cache(cache)
+    else:
+        days = cache["days"]
+        fresh_days = {}
+
+    # Today (and anything not cached) comes from the fresh run
+    rows = {**days, **fresh_days}
+    daily = [
+        rows[day] for day in sorted(rows)
+        if (since or "") <= day <= (until or "9999-99-99")
+    ]
+    return {"daily": daily}
+
+
 def format_model_name(model: str) -> str:
     """Shorten model name for display."""
     return (model
@@ -125,8 +373,13 @@ def wrap_exercises(exercise_str: str, width: int) -> list:
     return lines if lines else [""]
 
 
-def print_table(ccusage_data, exercise_data):
-    """Print combined table matching ccusage format with exercise columns."""
+def render_table(ccusage_data, exercise_data, usage_pending: bool = False) -> list:
+    """
+    Combined table matching ccusage format with exercise columns, as lines.
+
+    With `usage_pending`, usage hasn't arrived yet and the Models column says so.
+    """
+    lines = []
 
     # Column widths
     DATE_W = 10
@@ -159,10 +412,10 @@ def print_table(ccusage_data, exercise_data):
                 f"{exercises:<{EXERCISE_W}} {V}")
 
     # Header
-    print(hline(TL, TT, TR))
-    print(row("Date", "Models", "Input", "Output", "Cache Create", "Cache Read",
+    lines.append(hline(TL, TT, TR))
+    lines.append(row("Date", "Models", "Input", "Output", "Cache Create", "Cache Read",
               "Total Tokens", "Cost", "Exercises"))
-    print(hline(LT, X, RT))
+    lines.append(hline(LT, X, RT))
 
     # Collect all dates
     all_dates = set()
@@ -215,8 +468,11 @@ def print_table(ccusage_data, exercise_data):
         exercise_lines = wrap_exercises(exercise_str, EXERCISE_W)
 
         # First row with data
-        first_model = f"- {models[0]}" if models else "-"
-        print(row(
+        if usage_pending:
+            first_model = "(loading usage...)"
+        else:
+            first_model = f"- {models[0]}" if models else "-"
+        lines.append(row(
             date,
             first_model,
             f"{input_tokens:,}" if input_tokens else "",
@@ -237,31 +493,189 @@ def print_table(ccusage_data, exercise_data):
         for j in range(max_extra_rows):
             model_str = f"- {remaining_models[j]}" if j < len(remaining_models) else ""
             exercise_continuation = remaining_exercises[j] if j < len(remaining_exercises) else ""
-            print(row("", model_str, "", "", "", "", "", "", exercise_continuation))
+            lines.append(row("", model_str, "", "", "", "", "", "", exercise_continuation))
 
         # Separator between days (except last)
         if i < len(sorted_dates) - 1:
-            print(hline(LT, X, RT))
+            lines.append(hline(LT, X, RT))
 
     # Total row
-    print(hline(LT, X, RT))
+    lines.append(hline(LT, X, RT))
     total_exercise_str = format_exercises(dict(total_exercises))
     total_exercise_lines = wrap_exercises(total_exercise_str, EXERCISE_W)
-    print(row(
-        "Total",
-        "",
+    usage_totals = [
         f"{total_input:,}",
         f"{total_output:,}",
         f"{total_cache_c:,}",
         f"{total_cache_r:,}",
         f"{total_tokens:,}",
-        f"${total_cost:,.2f}",
+        f"${total_cost:,.2f}"
+    ]
+    if usage_pending:
+        usage_totals = [""] * len(usage_totals)
+    lines.append(row(
+        "Total",
+        "",
+        *usage_totals,
         total_exercise_lines[0] if total_exercise_lines else ""
     ))
     # Additional rows for wrapped exercise totals
     for extra_line in total_exercise_lines[1:]:
-        print(row("", "", "", "", "", "", "", "", extra_line))
-    print(hline(BL, BT, BR))
+        lines.append(row("", "", "", "", "", "", "", "", extra_line))
+    lines.append(hline(BL, BT, BR))
+    return lines
+
+
+def print_table(ccusage_data, exercise_data):
+    """Print combined table matching ccusage format with exercise columns."""
+    print("\n".join(render_table(ccusage_data, exercise_data)))
+
+
+def redraw(old_lines: list, new_lines: list):
+    """Replace a table already on the terminal, or print below it if it scrolled away."""
+    rows = shutil.get_terminal_size().lines
+    if old_lines and len(old_lines) < rows:
+        # Cursor to the start of the old table, then clear to end of screen
+        sys.stdout.write(f"\x1b[{len(old_lines)}F\x1b[J")
+    if new_lines:
+        sys.stdout.write("\n".join(new_lines) + "\n")
+    sys.stdout.flush()
+
+
+def log_signature(log_file: Path = LOG_FILE):
+    """Cheap change check for the exercise log (one stat call)."""
+    try:
+        st = log_file.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def cache_signature():
+    """Change check for the usage cache file (another run may have updated it)."""
+    try:
+        st = CCUSAGE_CACHE_FILE.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def transcript_signature():
+    """
+    Change check for today's usage: (path, size, mtime) of every transcript
+    written since midnight, one stat() per transcript.
+    """
+    start = day_start(date.today().isoformat())
+    recent = []
+    for path, entry in transcript_dirs().items():
+        for name in entry[2]:
+            try:
+                st = os.stat(os.path.join(path, name))
+            except OSError:
+                continue
+            if st.st_mtime >= start:
+                recent.append((path, name, st.st_size, st.st_mtime_ns))
+    return sorted(recent)
+
+
+# Seconds before --watch retries a failed usage refresh
+USAGE_RETRY = 5.0
+
+
+def watch(args, since, until, use_cache: bool, engine: str,
+          interval: float = 1.0, usage_interval: float = 10.0) -> int:
+    """
+    Keep the table on screen and redraw it in place when the data changes.
+
+    Between changes this is one stat() of the log per `interval`. When the
+    log grows, only the appended lines are read and added to their days; a
+    replaced or truncated log (rotation, edits) is reloaded from the index.
+
+    Every `usage_interval` seconds (None: no usage) the transcripts written
+    today and the usage cache are checked, and usage is only read again in the
+    background when one of them changed. A failed refresh keeps the last
+    usage on screen and is retried after `USAGE_RETRY` seconds.
+    """
+    signature = False  # Never equal to a real signature (or None), so the first pass loads
+    exercise_data = {}
+    position = None
+    ccusage_data = None
+    usage = None
+    usage_seen = None  # (transcripts, cache) signatures the shown usage was read at
+    next_usage = 0.0
+    usage_error = None
+    shown = []
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        while True:
+            changed = not shown
+
+            if usage is None and usage_interval is not None and time.monotonic() >= next_usage:
+                next_usage = time.monotonic() + usage_interval
+                current = (transcript_signature(), cache_signature())
+                if current != usage_seen:
+                    usage_seen = current
+                    usage = pool.submit(get_ccusage_data, args, use_cache, engine)
+
+            current = log_signature()
+            if current != signature:
+                signature = current
+                folded = fold_appended(exercise_data, position, since, until) if position else None
+                if folded is None:
+                    latest, position = load_exercise_state(since, until)
+                    changed = changed or latest != exercise_data
+                    exercise_data = latest
+                else:
+                    position, added = folded
+                    changed = changed or added
+
+            if usage is not None and usage.done():
+                try:
+                    latest = usage.result()
+                    error = None if latest is not None else "no usage data returned"
+                except Exception as e:
+                    latest, error = None, str(e) or type(e).__name__
+                usage = None
+                if error is None:
+                    # The refresh's own cache write isn't a change
+                    usage_seen = (usage_seen[0], cache_signature())
+                else:
+                    usage_seen = None
+                    next_usage = time.monotonic() + USAGE_RETRY
+                changed = changed or error != usage_error
+                usage_error = error
+                if latest is not None:
+                    changed = changed or latest != ccusage_data
+                    ccusage_data = latest
+
+            if changed:
+                lines = render_table(ccusage_data, exercise_data,
+                                     usage_pending=ccusage_data is None and usage is not None)
+                if usage_error:
+                    lines.append(f"Usage refresh failed ({usage_error}); retrying in {USAGE_RETRY:.0f}s")
+                lines.append(f"Watching {LOG_FILE} (Ctrl+C to exit)")
+                redraw(shown, lines)
+                shown = lines
+
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def pop_option(args: list, name: str):
+    """Remove `name VALUE` or `name=VALUE` from args and return VALUE (None if absent)."""
+    for i, arg in enumerate(args):
+        if arg == name and i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+        if arg.startswith(name + "="):
+            del args[i]
+            return arg.split("=", 1)[1]
+    return None
 
 
 def main():
@@ -273,18 +687,82 @@ def main():
     if exercises_only:
         args.remove("--exercises-only")
 
-    exercise_data = load_exercise_data()
+    # --no-cache: always read usage for the full range
+    use_cache = "--no-cache" not in args
+    if not use_cache:
+        args.remove("--no-cache")
+
+    # --native: parse Claude Code transcripts in-process instead of running `npx ccusage`
+    engine = "native" if "--native" in args else "ccusage"
+    if engine == "native":
+        args.remove("--native")
+
+    # --deadline SECONDS: on a terminal, show exercises if usage takes longer than this
+    deadline = pop_option(args, "--deadline") or os.getenv("VIBEREPS_USAGE_DEADLINE", "1.0")
+    try:
+        deadline = max(0.0, float(deadline))
+    except ValueError:
+        print(f"Invalid --deadline: {deadline}", file=sys.stderr)
+        return 2
+
+    # --watch: keep the table open and redraw it as exercises are logged
+    watching = "--watch" in args
+    if watching:
+        args.remove("--watch")
+    interval = pop_option(args, "--interval") or "1"
+    try:
+        interval = max(0.1, float(interval))
+    except ValueError:
+        print(f"Invalid --interval: {interval}", file=sys.stderr)
+        return 2
+
+    # --since/--until apply to the exercise log too
+    date_range = split_range_args(args)
+    since, until = date_range[:2] if date_range else (None, None)
+
+    if watching:
+        if not sys.stdout.isatty():
+            print("--watch needs a terminal", file=sys.stderr)
+            return 2
+        if exercises_only:
+            return watch(args, since, until, use_cache, engine, interval, usage_interval=None)
+        return watch(args, since, until, use_cache, engine, interval)
 
     if exercises_only:
-        ccusage_data = None
-    else:
-        ccusage_data = get_ccusage_data(args)
+        exercise_data = load_exercise_data(since, until)
+        if not exercise_data:
+            print("No data found. Complete some exercises or run ccusage first.")
+            return 1
+        print_table(None, exercise_data)
+        return 0
+
+    # Usage (subprocess or transcript parsing) runs alongside the local log read
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        usage = pool.submit(get_ccusage_data, args, use_cache, engine)
+        exercise_data = load_exercise_data(since, until)
+
+        shown = []
+        if sys.stdout.isatty():
+            # Progressive: exercises first, usage filled in when it arrives
+            try:
+                usage.exception(timeout=deadline)
+            except FutureTimeout:
+                shown = render_table(None, exercise_data, usage_pending=True)
+                redraw([], shown)
+        try:
+            ccusage_data = usage.result()
+        except Exception as e:
+            # Still show the exercises
+            print(f"Warning: could not read Claude usage ({e or type(e).__name__})", file=sys.stderr)
+            ccusage_data = None
 
     if not ccusage_data and not exercise_data:
+        if shown:
+            redraw(shown, [])
         print("No data found. Complete some exercises or run ccusage first.")
         return 1
 
-    print_table(ccusage_data, exercise_data)
+    redraw(shown, render_table(ccusage_data, exercise_data))
     return 0
 
 